@@ -0,0 +1,146 @@
+"""Overlapped extract and load on one asyncio event loop, using psycopg 3's async COPY.
+
+Each table runs an mdb-export reader and a COPY writer joined by a queue
+bounded in bytes, so the exporter keeps reading while the server is busy
+and the connection keeps writing while the exporter catches up. Several
+tables can be in flight at once. psycopg 3 is only imported when this
+pipeline is used.
+"""
+import asyncio
+import os
+import subprocess
+from collections import deque
+from time import time
+
+from copy_stream import COPY_CHUNK_SIZE
+from pg_pool import commit_durably_async
+
+ASYNC_QUEUE_BYTES = int(os.getenv("ASYNC_QUEUE_BYTES", 64 * 1024 * 1024))
+ASYNC_TABLES_IN_FLIGHT = int(os.getenv("ASYNC_TABLES_IN_FLIGHT", 4))
+
+class ByteBoundedQueue:
+    """Queue of byte chunks whose producer waits once ``max_bytes`` are buffered.
+
+    An empty queue always admits the next chunk, so a chunk larger than the
+    limit cannot stall the pipeline. ``close`` ends the stream, optionally
+    with an error that is raised to the consumer.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._chunks = deque()
+        self._condition = asyncio.Condition()
+        self._closed = False
+        self._error = None
+
+    async def put(self, chunk):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.bytes == 0 or self.bytes + len(chunk) <= self.max_bytes)
+            self._chunks.append(chunk)
+            self.bytes += len(chunk)
+            self._condition.notify_all()
+
+    async def get(self):
+        """Return the next chunk, or None once the stream is closed and drained."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._chunks or self._closed)
+            if self._error is not None:
+                raise self._error
+            if not self._chunks:
+                return None
+            chunk = self._chunks.popleft()
+            self.bytes -= len(chunk)
+            self._condition.notify_all()
+            return chunk
+
+    async def close(self, error=None):
+        async with self._condition:
+            self._closed = True
+            self._error = error
+            self._condition.notify_all()
+
+async def export_to_queue(mdb_file, table, queue, rewrite_header=None):
+    """Stream ``mdb-export`` output for a table into ``queue``, rewriting the header line if asked."""
+    process = await asyncio.create_subprocess_exec(
+        "mdb-export", "-b", "strip", "-H", mdb_file, table,
+        stdout=asyncio.subprocess.PIPE, limit=COPY_CHUNK_SIZE
+    )
+    try:
+        header = await process.stdout.readline()
+        if rewrite_header is not None:
+            headers = [name.strip() for name in header.decode().strip().split(',')]
+            header = (','.join(rewrite_header(headers)) + '\n').encode()
+        await queue.put(header)
+        while chunk := await process.stdout.read(COPY_CHUNK_SIZE):
+            await queue.put(chunk)
+        if await process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, ["mdb-export", mdb_file, table])
+    except BaseException as e:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        await queue.close(e if isinstance(e, Exception) else RuntimeError(f"Export of {table} was cancelled"))
+        raise
+    await queue.close()
+
+async def copy_from_queue(conn, copy_sql, queue):
+    """Write queued chunks into COPY and return the row count the server reports."""
+    async with conn.cursor() as cursor:
+        async with cursor.copy(copy_sql) as copy:
+            while (chunk := await queue.get()) is not None:
+                await copy.write(chunk)
+        return cursor.rowcount
+
+async def load_table(connect, mdb_file, table, copy_sql, rewrite_header=None, check=None, queue_bytes=ASYNC_QUEUE_BYTES):
+    """Load one table over its own connection and return ``(rows, elapsed)``.
+
+    ``check(rows)``, if given, runs before the commit and can reject the load
+    by raising.
+    """
+    start_time = time()
+    conn = await connect()
+    try:
+        queue = ByteBoundedQueue(queue_bytes)
+        reader = asyncio.create_task(export_to_queue(mdb_file, table, queue, rewrite_header))
+        try:
+            rows = await copy_from_queue(conn, copy_sql, queue)
+            await reader
+        except BaseException:
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+            raise
+        if check is not None:
+            check(rows)
+        await commit_durably_async(conn)
+        return rows, time() - start_time
+    except BaseException:
+        await conn.rollback()
+        raise
+    finally:
+        await conn.close()
+
+async def load_tables(connect, mdb_file, jobs, in_flight, queue_bytes):
+    """Run ``load_table`` for every ``{table: (copy_sql, rewrite_header, check)}`` job, at most ``in_flight`` at once.
+
+    Returns ``{table: (rows, elapsed) or exception}``.
+    """
+    semaphore = asyncio.Semaphore(max(in_flight, 1))
+
+    async def run(table, copy_sql, rewrite_header, check):
+        async with semaphore:
+            return await load_table(connect, mdb_file, table, copy_sql, rewrite_header, check, queue_bytes)
+
+    results = await asyncio.gather(*(run(table, *job) for table, job in jobs.items()), return_exceptions=True)
+    return dict(zip(jobs, results))
+
+def run_async_loads(connect_kwargs, mdb_file, jobs, in_flight=ASYNC_TABLES_IN_FLIGHT, queue_bytes=ASYNC_QUEUE_BYTES):
+    """Load tables through the async pipeline from synchronous code; see ``load_tables``."""
+    try:
+        import psycopg
+    except ImportError as e:
+        raise ImportError("The async COPY pipeline needs psycopg 3 (pip install psycopg)") from e
+
+    def connect():
+        return psycopg.AsyncConnection.connect(**connect_kwargs)
+
+    return asyncio.run(load_tables(connect, mdb_file, jobs, in_flight, queue_bytes))
@@ -0,0 +1,339 @@
+from dotenv import load_dotenv
+import argparse
+import getpass
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import logging
+from time import time
+from datetime import datetime, timedelta
+from psycopg2.extensions import parse_dsn
+from copy_stream import COPY_CHUNK_SIZE, HashingStream
+from ddl import parse_column_types
+from naming import snake_case
+
+# Load environment variables
+load_dotenv()
+
+# Benchmarks run against a throwaway database, never the PG_* import target
+BENCH_DSN = os.getenv("BENCH_DSN", "host=localhost dbname=xopti_bench")
+BENCH_SCHEMA_FILE = os.getenv("BENCH_SCHEMA_FILE", "schema.sql")
+BENCH_RESULTS_DIR = os.getenv("BENCH_RESULTS_DIR", "bench_results")
+BENCH_TABLES = ["txdetails", "txheader", "inventory", "customer"]
+BENCH_SCALES = "10k,1M"
+# Runs per stage; reported times are medians
+BENCH_REPEATS = int(os.getenv("BENCH_REPEATS", 3))
+
+# Distinct rows generated per table; the emitter cycles through them so it streams at pipe speed like mdb-export
+ROW_POOL_SIZE = 10000
+MDB_EXPORT_DATE_FORMAT = "%m/%d/%y %H:%M:%S"
+# extract drains the export, transform runs import6's client side into a discarding cursor, copy runs a verified load
+STAGES = ["extract", "transform", "copy"]
+# Put ahead of PATH so import6 spawns the synthetic exporter instead of mdb-tools
+MDB_TOOL_SHIMS = ["mdb-export", "mdb-schema"]
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s|%(levelname)s|%(message)s",
+    handlers=[logging.StreamHandler(sys.stderr)]
+)
+logger = logging.getLogger()
+
+def parse_scale(text):
+    """Parse a row count such as 10k, 1M or 2500."""
+    text = text.strip().lower()
+    multiplier = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+def load_table_types(tables):
+    """Column types for the benchmark tables, taken from the mdb-schema output in schema.sql."""
+    with open(BENCH_SCHEMA_FILE) as f:
+        column_types = parse_column_types(f.read())
+    return {table: column_types[table] for table in tables}
+
+def random_value(rng, pg_type, base_date, date_format=MDB_EXPORT_DATE_FORMAT):
+    """Generate one value in mdb-export's text form for a column type."""
+    kind = pg_type.split("(")[0].strip()
+    if kind == "VARCHAR":
+        length = int(pg_type.split("(")[1].rstrip(")"))
+        return "".join(rng.choices(string.ascii_uppercase + string.digits, k=rng.randint(1, length)))
+    if kind == "TEXT":
+        return " ".join(rng.choice(["lens", "frame", "repair", "rush", "promo", "note"]) for _ in range(rng.randint(0, 12)))
+    if kind in ("INTEGER", "SERIAL", "SMALLINT"):
+        return str(rng.randint(0, 30000))
+    if kind == "REAL":
+        return f"{rng.uniform(-10, 100):.2f}"
+    if kind == "NUMERIC":
+        return f"{rng.uniform(0, 50000):.2f}"
+    if kind == "BOOLEAN":
+        return rng.choice(["0", "1"])
+    if kind.startswith("TIMESTAMP"):
+        return (base_date + timedelta(seconds=rng.randint(0, 5 * 365 * 86400))).strftime(date_format)
+    return ""
+
+def csv_quote(value):
+    """Quote a field the way mdb-export does for text containing separators."""
+    if any(c in value for c in ',"\n '):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+def emit_table(table, rows, seed, date_format=MDB_EXPORT_DATE_FORMAT):
+    """Write ``rows`` synthetic rows of a table to stdout as mdb-export -H style CSV with a header."""
+    column_types = load_table_types([table])[table]
+    rng = random.Random(seed)
+    base_date = datetime(2020, 1, 1)
+    pool = [
+        (",".join(csv_quote(random_value(rng, pg_type, base_date, date_format)) for pg_type in column_types.values()) + "\n").encode()
+        for _ in range(min(rows, ROW_POOL_SIZE))
+    ]
+    out = sys.stdout.buffer
+    out.write((",".join(column_types) + "\n").encode())
+    remaining = rows
+    while remaining > 0:
+        block = pool[:remaining]
+        out.write(b"".join(block))
+        remaining -= len(block)
+    out.flush()
+
+def emulate_mdb_tool(tool, argv):
+    """Answer an mdb-export or mdb-schema call from import6 with the synthetic table or schema.sql.
+
+    The "MDB file" is schema.sql itself; row count and seed come from the
+    BENCH_ROWS and BENCH_SEED variables the stage run was started with.
+    """
+    if tool == "mdb-schema":
+        with open(argv[0]) as f:
+            sys.stdout.write(f.read())
+        return
+    parser = argparse.ArgumentParser(prog=tool)
+    parser.add_argument("-b")
+    parser.add_argument("-H", action="store_true")
+    parser.add_argument("-D")
+    parser.add_argument("-T")
+    parser.add_argument("mdb_file")
+    parser.add_argument("table")
+    args = parser.parse_args(argv)
+    emit_table(args.table, int(os.environ["BENCH_ROWS"]), int(os.environ["BENCH_SEED"]), args.T or MDB_EXPORT_DATE_FORMAT)
+
+def write_shims(directory):
+    """Create mdb-tools stand-ins in ``directory`` that call back into this script."""
+    for tool in MDB_TOOL_SHIMS:
+        path = os.path.join(directory, tool)
+        with open(path, "w") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.abspath(__file__)}" --mdb-tool {tool} "$@"\n')
+        os.chmod(path, 0o755)
+
+def stage_env(shim_dir, rows, seed):
+    """Environment for a stage run: import6 settings from .env, with the source and database pinned to the benchmark.
+
+    PG_* always come from BENCH_DSN, so the run never touches the import target.
+    """
+    dsn = parse_dsn(BENCH_DSN)
+    env = dict(os.environ)
+    env.update({
+        "PATH": shim_dir + os.pathsep + env.get("PATH", ""),
+        "MDB_FILE": os.path.abspath(BENCH_SCHEMA_FILE),
+        "MDB_FILES": "",
+        "SOURCE_COLUMN": "",
+        "MDB_READER": "mdb-export",
+        "MDB_CACHE_DIR": os.path.join(shim_dir, "mdb_cache"),
+        "LOG_FILE": os.devnull,
+        "PG_HOST": dsn.get("host", "localhost"),
+        "PG_PORT": dsn.get("port", "5432"),
+        "PG_DB": dsn.get("dbname", ""),
+        "PG_USER": dsn.get("user", getpass.getuser()),
+        # libpq ignores the password under trust authentication; put a real one in BENCH_DSN otherwise
+        "PG_PASSWORD": dsn.get("password", "unused"),
+        "BENCH_ROWS": str(rows),
+        "BENCH_SEED": str(seed),
+    })
+    return env
+
+class ByteCounter:
+    """Digest stand-in for HashingStream that only counts bytes."""
+    def __init__(self):
+        self.bytes = 0
+
+    def update(self, data):
+        self.bytes += len(data)
+
+def drain(stream):
+    """Read a stream to the end in COPY-sized chunks, as copy_expert would."""
+    while stream.read(COPY_CHUNK_SIZE):
+        pass
+
+class DrainCursor:
+    """Cursor stand-in whose COPY reads the stream to the end without a server."""
+    rowcount = -1
+
+    def copy_expert(self, sql, file, size=COPY_CHUNK_SIZE):
+        while file.read(size):
+            pass
+
+def create_bench_table(cursor, table, column_types):
+    """Create an empty bench_<table> with the schema.sql column types."""
+    columns = ", ".join(f'"{snake_case(column)}" {pg_type}' for column, pg_type in column_types.items())
+    cursor.execute(f'DROP TABLE IF EXISTS "bench_{table}"')
+    cursor.execute(f'CREATE TABLE "bench_{table}" ({columns})')
+
+def extract(table):
+    """Drain the synthetic mdb-export for a table and return the bytes it wrote."""
+    counter = ByteCounter()
+    process = subprocess.Popen(
+        ["mdb-export", "-b", "strip", "-H", BENCH_SCHEMA_FILE, table], stdout=subprocess.PIPE, bufsize=COPY_CHUNK_SIZE
+    )
+    try:
+        drain(HashingStream(process.stdout, counter))
+    except Exception:
+        process.kill()
+        raise
+    finally:
+        process.wait()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, process.args)
+    return counter.bytes
+
+def run_stage(stage, table, rows, seed):
+    """Run one pipeline stage in this process and return its measurements.
+
+    The transform and copy stages call import6 itself, so its COPY_FORMAT,
+    TRANSFORMS, VERIFY_AGGREGATES, REJECT_MODE and pool settings apply.
+    """
+    spans = {}
+    if stage == "extract":
+        start_time = time()
+        byte_count = extract(table)
+    else:
+        # import6 reads its settings at import time, from the environment stage_env() prepared
+        import import6
+        target = f"bench_{table}"
+        try:
+            if stage == "copy":
+                import6.run_in_transaction(create_bench_table, table, load_table_types([table])[table])
+                start_time = time()
+                import6.run_in_transaction(import6.copy_verified, table, target, target, {}, rows, trace_table=target)
+            else:
+                start_time = time()
+                import6.copy_table(DrainCursor(), import6.MDB_FILE, table, target, {})
+        finally:
+            import6.shutdown_pool()
+            import6.pool.close()
+        spans = {span_stage: totals for (span_stage, span_table), totals in import6.tracer.totals().items() if span_table == target}
+        byte_count = spans.get("transform", {}).get("bytes")
+    elapsed = time() - start_time
+    return {
+        "time": elapsed,
+        "bytes": byte_count,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "emitter_peak_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        "spans": spans,
+    }
+
+def measure(stage, table, rows, seed, shim_dir):
+    """Run a stage in a fresh interpreter so peak RSS is measured per run."""
+    result = subprocess.run(
+        [sys.executable, __file__, "--stage", stage, table, str(rows), str(seed)],
+        capture_output=True, text=True, check=True, env=stage_env(shim_dir, rows, seed)
+    )
+    return json.loads(result.stdout)
+
+def git_revision():
+    """Short commit hash of the importer being benchmarked, if available."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(tables, scales, stages, seed, shim_dir, repeats=BENCH_REPEATS):
+    """Benchmark every table at every scale and return the result rows."""
+    results = []
+    for rows in scales:
+        for table in tables:
+            runs = {}
+            for stage in stages:
+                runs[stage] = [measure(stage, table, rows, seed, shim_dir) for _ in range(max(repeats, 1))]
+                logger.info(
+                    f"Benchmark run|table={table}|rows={rows}|stage={stage}|runs={len(runs[stage])}"
+                    f"|time={statistics.median(run['time'] for run in runs[stage]):.2f}"
+                )
+            # The last stage runs the whole pipeline, and import6's meters split each of its runs by stage in-process
+            pipeline = runs[stages[-1]]
+            stage_times = {
+                stage: statistics.median(run["spans"].get(stage, {}).get("seconds", 0.0) for run in pipeline)
+                for stage in stages
+            }
+            elapsed = statistics.median(run["time"] for run in pipeline)
+            # Throughput is measured in mdb-export bytes, which the extract stage counts on every path
+            export_bytes = runs["extract"][0]["bytes"]
+            all_runs = [run for stage_runs in runs.values() for run in stage_runs]
+            results.append({
+                "table": table,
+                "rows": rows,
+                "bytes": export_bytes,
+                "time": elapsed,
+                "rows_per_sec": rows / elapsed if elapsed else None,
+                "mb_per_sec": export_bytes / 1048576 / elapsed if elapsed else None,
+                "peak_rss_kb": max(run["peak_rss_kb"] for run in all_runs),
+                "emitter_peak_rss_kb": max(run["emitter_peak_rss_kb"] for run in all_runs),
+                "stages": stage_times,
+                "runs": runs,
+            })
+            logger.info(
+                f"Benchmark result|table={table}|rows={rows}|rows_per_sec={results[-1]['rows_per_sec']:.0f}"
+                f"|mb_per_sec={results[-1]['mb_per_sec']:.1f}|peak_rss_kb={results[-1]['peak_rss_kb']}"
+            )
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark import6's mdb-export -> transform -> COPY pipeline on synthetic data.")
+    parser.add_argument("--tables", default=",".join(BENCH_TABLES), help="comma-separated schema.sql tables")
+    parser.add_argument("--scales", default=BENCH_SCALES, help="comma-separated row counts, e.g. 10k,1M,10M")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=BENCH_REPEATS, help="runs per stage, reported as the median")
+    parser.add_argument("--no-db", action="store_true", help="skip the COPY stage (no PostgreSQL needed)")
+    parser.add_argument("--output", help="results file (default: bench_results/bench_<revision>_<timestamp>.json)")
+    parser.add_argument("--mdb-tool", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    parser.add_argument("--stage", nargs=4, metavar=("STAGE", "TABLE", "ROWS", "SEED"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mdb_tool:
+        emulate_mdb_tool(args.mdb_tool[0], args.mdb_tool[1:])
+        return
+    if args.stage:
+        stage, table, rows, seed = args.stage
+        print(json.dumps(run_stage(stage, table, int(rows), int(seed))))
+        return
+
+    tables = [t.strip() for t in args.tables.split(",") if t.strip()]
+    scales = [parse_scale(s) for s in args.scales.split(",") if s.strip()]
+    stages = STAGES[:-1] if args.no_db else STAGES
+    revision = git_revision()
+    with tempfile.TemporaryDirectory(prefix="bench_mdb_tools_") as shim_dir:
+        write_shims(shim_dir)
+        results = run_benchmarks(tables, scales, stages, args.seed, shim_dir, args.repeat)
+
+    output = args.output or os.path.join(
+        BENCH_RESULTS_DIR, f"bench_{revision or 'unknown'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "revision": revision,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "copy_chunk_size": COPY_CHUNK_SIZE,
+            "stages": stages,
+            "repeats": args.repeat,
+            "results": results,
+        }, f, indent=2)
+    logger.info(f"Benchmark results written|path={output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""SQLite journal of import runs and per-table outcomes, so an interrupted import can resume.
+
+It also keeps the content hash of each table's last successful load, which
+lets a later run skip tables whose source has not changed.
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+CHECKPOINT_FILE = os.getenv("CHECKPOINT_FILE", "import_checkpoints.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    mdb_file TEXT NOT NULL,
+    source_key TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT
+);
+CREATE TABLE IF NOT EXISTS run_tables (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    table_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    rows INTEGER,
+    source_key TEXT NOT NULL,
+    error TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, table_name)
+);
+CREATE TABLE IF NOT EXISTS table_hashes (
+    table_name TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    updated_at TEXT NOT NULL
+);
+"""
+
+def now():
+    return datetime.now().isoformat(timespec="seconds")
+
+class CheckpointJournal:
+    """Per-table status (pending, running, done, failed, skipped) for each import run, shared by worker threads."""
+    def __init__(self, path=CHECKPOINT_FILE):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def start_run(self, mdb_file, source_key, mode, tables):
+        """Record a new run with every table pending and return its id."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (mdb_file, source_key, mode, status, started_at) VALUES (?, ?, ?, 'running', ?)",
+                (mdb_file, source_key, mode, now())
+            )
+            run_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO run_tables (run_id, table_name, status, source_key, updated_at) VALUES (?, ?, 'pending', ?, ?)",
+                [(run_id, table, source_key, now()) for table in tables]
+            )
+            return run_id
+
+    def resumable_run(self, mdb_file, source_key):
+        """Return the id of the latest unfinished run over the same source file contents, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id, source_key FROM runs WHERE mdb_file = ? AND status <> 'complete' "
+                "AND run_id = (SELECT max(run_id) FROM runs WHERE mdb_file = ?)",
+                (mdb_file, mdb_file)
+            ).fetchone()
+        if row is None or row[1] != source_key:
+            return None
+        return row[0]
+
+    def tables_with_status(self, run_id, statuses):
+        """Return the tables of a run whose status is one of ``statuses``."""
+        placeholders = ", ".join("?" for _ in statuses)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT table_name FROM run_tables WHERE run_id = ? AND status IN ({placeholders}) ORDER BY table_name",
+                (run_id, *statuses)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def mark(self, run_id, table, status, rows=None, error=None):
+        """Update one table's status in a run."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE run_tables SET status = ?, rows = coalesce(?, rows), error = ?, updated_at = ? "
+                "WHERE run_id = ? AND table_name = ?",
+                (status, rows, error, now(), run_id, table)
+            )
+
+    def content_hashes(self, tables):
+        """Return ``{table: hash}`` recorded by the last successful load of each table."""
+        placeholders = ", ".join("?" for _ in tables)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT table_name, content_hash FROM table_hashes WHERE table_name IN ({placeholders})", tuple(tables)
+            ).fetchall()
+        return dict(rows)
+
+    def forget_hashes(self, tables):
+        """Drop the recorded hashes of tables about to be reloaded, so a failed reload never looks unchanged."""
+        with self._lock:
+            self._conn.executemany("DELETE FROM table_hashes WHERE table_name = ?", [(table,) for table in tables])
+
+    def finish_run(self, run_id):
+        """Close a run, marking it complete only if every table is done or skipped; return the final status."""
+        with self._lock:
+            remaining = self._conn.execute(
+                "SELECT count(*) FROM run_tables WHERE run_id = ? AND status NOT IN ('done', 'skipped')", (run_id,)
+            ).fetchone()[0]
+            status = "complete" if remaining == 0 else "incomplete"
+            self._conn.execute(
+                "UPDATE runs SET status = ?, finished_at = ? WHERE run_id = ?", (status, now(), run_id)
+            )
+            return status
+
+    def checkpointed(self, run_id, load, rows_for=None, hash_for=None):
+        """Wrap ``load(table)`` so the table is marked running, then done or failed with its error.
+
+        With ``hash_for``, a finished table's content hash is recorded along
+        with its done status.
+        """
+        def run(table):
+            self.mark(run_id, table, "running")
+            try:
+                result = load(table)
+            except Exception as e:
+                self.mark(run_id, table, "failed", error=str(e))
+                raise
+            self.mark(run_id, table, "done", rows=rows_for(table) if rows_for else None)
+            content_hash = hash_for(table) if hash_for else None
+            if content_hash is not None:
+                with self._lock:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO table_hashes (table_name, content_hash, run_id, updated_at) VALUES (?, ?, ?, ?)",
+                        (table, content_hash, run_id, now())
+                    )
+            return result
+        return run
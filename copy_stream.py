@@ -0,0 +1,255 @@
+"""Byte-oriented file adapters for streaming mdb-export output into COPY."""
+import csv
+import io
+import subprocess
+from time import perf_counter
+
+# Chunk size handed to copy_expert and used for the mdb-export pipe buffer
+COPY_CHUNK_SIZE = 4 * 1024 * 1024
+
+class HeaderRewritingReader:
+    """Wrap a binary stream so that COPY sees a replacement header followed by the raw remainder.
+
+    The caller consumes the original header line from the stream first; every
+    later read is passed straight through to the pipe, honouring ``size``.
+    """
+    def __init__(self, stream, header_line):
+        self.stream = stream
+        self._header = header_line.encode() if isinstance(header_line, str) else header_line
+
+    def read(self, size=-1):
+        if self._header:
+            data, self._header = self._header, b''
+            return data
+        if size is None or size < 0:
+            return self.stream.read()
+        return self.stream.read(size)
+
+    def readline(self, size=-1):
+        if self._header:
+            data, self._header = self._header, b''
+            return data
+        return self.stream.readline(size)
+
+    def close(self):
+        pass
+
+class HashingStream:
+    """Pass reads through from a binary stream while feeding every byte to a hashlib digest."""
+    def __init__(self, stream, digest):
+        self.stream = stream
+        self.digest = digest
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.digest.update(data)
+        return data
+
+    def readline(self, size=-1):
+        data = self.stream.readline(size)
+        self.digest.update(data)
+        return data
+
+class IterableReader:
+    """Present an iterable of byte chunks as a file object, honouring ``size`` on read."""
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = bytearray()
+        self._exhausted = False
+
+    def _fill(self, size):
+        while not self._exhausted and (size < 0 or len(self._buffer) < size):
+            try:
+                self._buffer += next(self._chunks)
+            except StopIteration:
+                self._exhausted = True
+
+    def read(self, size=-1):
+        if size is None:
+            size = -1
+        self._fill(size)
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readline(self, size=-1):
+        while b'\n' not in self._buffer and not self._exhausted:
+            self._fill(len(self._buffer) + 1)
+        end = self._buffer.find(b'\n') + 1 or len(self._buffer)
+        if size is not None and size >= 0:
+            end = min(end, size)
+        data = bytes(self._buffer[:end])
+        del self._buffer[:end]
+        return data
+
+    def close(self):
+        pass
+
+class MeteredStream:
+    """Pass reads through from a binary stream, counting bytes and the time spent waiting on it."""
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes = 0
+        self.wait_time = 0.0
+
+    def read(self, size=-1):
+        start = perf_counter()
+        data = self.stream.read(size)
+        self.wait_time += perf_counter() - start
+        self.bytes += len(data)
+        return data
+
+    def readline(self, size=-1):
+        start = perf_counter()
+        data = self.stream.readline(size)
+        self.wait_time += perf_counter() - start
+        self.bytes += len(data)
+        return data
+
+    def close(self):
+        pass
+
+class MeteredIterable:
+    """Iterate over a source, counting items and the time spent waiting on it."""
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.items = 0
+        self.wait_time = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = perf_counter()
+        try:
+            item = next(self._iterator)
+        finally:
+            self.wait_time += perf_counter() - start
+        self.items += 1
+        return item
+
+class RecordCountingStream:
+    """Pass reads through from a CSV byte stream, counting records as they go by.
+
+    Newlines inside double-quoted fields do not end a record; a doubled quote
+    toggles the quote state twice, so tracking quote parity is enough.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.newlines = 0
+        self._in_quotes = False
+        self._last_byte = b'\n'
+
+    @property
+    def records(self):
+        """Records seen so far, including a final record without a trailing newline."""
+        return self.newlines + (self._last_byte != b'\n')
+
+    def _count(self, data):
+        if not data:
+            return data
+        if b'"' not in data:
+            if not self._in_quotes:
+                self.newlines += data.count(b'\n')
+        else:
+            for i, part in enumerate(data.split(b'"')):
+                if i:
+                    self._in_quotes = not self._in_quotes
+                if not self._in_quotes:
+                    self.newlines += part.count(b'\n')
+        self._last_byte = data[-1:]
+        return data
+
+    def read(self, size=-1):
+        return self._count(self.stream.read(size))
+
+    def readline(self, size=-1):
+        return self._count(self.stream.readline(size))
+
+    def close(self):
+        pass
+
+class CsvRecordTap:
+    """Pass reads through from a CSV byte stream, handing each complete batch of parsed records to callbacks.
+
+    Records are only parsed up to the last newline outside double quotes, so a
+    record split across reads is parsed once it is complete. With
+    ``on_header``, the first record is passed there instead of to ``on_rows``.
+    """
+    def __init__(self, stream, on_rows, on_header=None):
+        self.stream = stream
+        self.on_rows = on_rows
+        self.on_header = on_header
+        self._pending = bytearray()
+        self._in_quotes = False
+
+    def _complete_length(self, data):
+        """Return how many bytes of ``data`` (appended to the pending tail) end on a record boundary."""
+        end = -1
+        offset = 0
+        for i, part in enumerate(data.split(b'"')):
+            if i:
+                self._in_quotes = not self._in_quotes
+                offset += 1
+            if not self._in_quotes:
+                newline = part.rfind(b'\n')
+                if newline >= 0:
+                    end = offset + newline
+            offset += len(part)
+        return end + 1
+
+    def _tap(self, data):
+        length = self._complete_length(data) if data else 0
+        if length:
+            complete = bytes(self._pending) + data[:length]
+            self._pending = bytearray(data[length:])
+            self._parse(complete)
+        elif data:
+            self._pending += data
+        elif self._pending:
+            complete, self._pending = bytes(self._pending), bytearray()
+            self._parse(complete)
+        return data
+
+    def _parse(self, complete):
+        rows = list(csv.reader(io.StringIO(complete.decode("utf-8"), newline="")))
+        if self.on_header is not None and rows:
+            self.on_header(rows.pop(0))
+            self.on_header = None
+        if rows:
+            self.on_rows(rows)
+
+    def read(self, size=-1):
+        return self._tap(self.stream.read(size))
+
+    def readline(self, size=-1):
+        return self._tap(self.stream.readline(size))
+
+    def close(self):
+        pass
+
+def copy_mdb_export(cursor, mdb_file, table, copy_sql, rewrite_header=None):
+    """Stream ``mdb-export`` output for a table straight into COPY and return the number of data rows.
+
+    ``rewrite_header``, if given, takes the exported header names and returns
+    the names COPY should see. Memory stays bounded by COPY_CHUNK_SIZE
+    whatever the table size.
+    """
+    process = subprocess.Popen(["mdb-export", "-b", "strip", "-H", mdb_file, table], stdout=subprocess.PIPE, bufsize=COPY_CHUNK_SIZE)
+    try:
+        counter = RecordCountingStream(process.stdout)
+        stream = counter
+        if rewrite_header is not None:
+            headers = [header.strip() for header in counter.readline().decode().strip().split(',')]
+            stream = HeaderRewritingReader(counter, ','.join(rewrite_header(headers)) + '\n')
+        cursor.copy_expert(copy_sql, stream, size=COPY_CHUNK_SIZE)
+    except Exception as e:
+        process.kill()
+        raise e
+    finally:
+        process.wait()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, process.args)
+    return max(counter.records - 1, 0)
@@ -0,0 +1,269 @@
+"""Helpers for splitting converted mdb-schema output into load phases and applying it."""
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import time
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_TOKENS = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|--[^\n]*|;""")
+INDEX_STATEMENT = re.compile(r'^create\s+(unique\s+)?index\b', re.IGNORECASE)
+CONSTRAINT_STATEMENT = re.compile(r'^alter\s+table\s+.*\badd\s+constraint\b', re.IGNORECASE | re.DOTALL)
+FOREIGN_KEY = re.compile(r'\bforeign\s+key\b', re.IGNORECASE)
+STATEMENT_TABLE = re.compile(r'^(?:create\s+(?:unique\s+)?index\s+.*?\bon|alter\s+table)\s+"([^"]+)"', re.IGNORECASE | re.DOTALL)
+CREATE_TABLE = re.compile(r'^create\s+table\s+(?:if\s+not\s+exists\s+)?"([^"]+)"\s*\((.*)\)\s*$', re.IGNORECASE | re.DOTALL)
+CREATE_TABLE_NAME = re.compile(r'^create\s+table\s+(?:if\s+not\s+exists\s+)?"([^"]+)"', re.IGNORECASE)
+COMMENT_TABLE = re.compile(r'^comment\s+on\s+(?:table|column)\s+"([^"]+)"', re.IGNORECASE)
+REFERENCES_TABLE = re.compile(r'\breferences\s+"([^"]+)"', re.IGNORECASE)
+# One pass over the script: string literals and comments are copied through,
+# ";" resets the table context and each quoted identifier is classified by
+# the keyword in front of it.
+SCHEMA_TOKENS = re.compile(
+    r"""'(?:[^']|'')*'|--[^\n]*|;|(?:\b(table|exists|on|references|column|constraint|index)\s+)?"((?:[^"]|"")*)"(\.)?""",
+    re.IGNORECASE
+)
+TABLE_KEYWORDS = {'table', 'exists', 'on', 'references'}
+NAME_KEYWORDS = {'constraint', 'index'}
+COLUMN_DEFINITION = re.compile(
+    r'"([^"]+)"\s+([a-z][a-z ]*?(?:\s*\([\d,\s]+\))?)(?=\s+not\s+null|\s+default|\s+primary|\s*,|\s*$)',
+    re.IGNORECASE
+)
+COLUMN_NOT_NULL = re.compile(r'"([^"]+)"\s+[a-z][a-z ]*?(?:\s*\([\d,\s]+\))?\s+not\s+null', re.IGNORECASE)
+
+def split_statements(schema):
+    """Split a SQL script on semicolons outside quotes, dropping comments and blank statements."""
+    statements = []
+    current = []
+    position = 0
+    for match in STATEMENT_TOKENS.finditer(schema):
+        current.append(schema[position:match.start()])
+        token = match.group(0)
+        position = match.end()
+        if token == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        elif not token.startswith('--'):
+            current.append(token)
+    current.append(schema[position:])
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+def split_schema_phases(schema):
+    """Split a converted schema into table DDL, per-table index/key DDL and foreign keys.
+
+    Returns ``(table_statements, index_statements, foreign_keys)`` where
+    ``index_statements`` maps each table name to its CREATE INDEX and
+    PRIMARY KEY/UNIQUE statements in their original order.
+    """
+    table_statements = []
+    index_statements = {}
+    foreign_keys = []
+    for stmt in split_statements(schema):
+        if CONSTRAINT_STATEMENT.match(stmt) and FOREIGN_KEY.search(stmt):
+            foreign_keys.append(stmt)
+        elif INDEX_STATEMENT.match(stmt) or CONSTRAINT_STATEMENT.match(stmt):
+            table = STATEMENT_TABLE.match(stmt).group(1)
+            index_statements.setdefault(table, []).append(stmt)
+        else:
+            table_statements.append(stmt)
+    return table_statements, index_statements, foreign_keys
+
+def split_schema_units(schema, include_indexes=True):
+    """Group a converted schema into per-table DDL units that can be applied independently.
+
+    Returns ``(preamble, units, index_statements, foreign_keys)``. ``preamble``
+    holds session statements such as ``SET client_encoding`` that every
+    connection runs first; ``units`` maps each table to its CREATE TABLE and
+    COMMENT statements, plus its index and key statements when
+    ``include_indexes`` is true (``index_statements`` is then empty).
+    """
+    table_statements, index_statements, foreign_keys = split_schema_phases(schema)
+    preamble = []
+    units = {}
+    for stmt in table_statements:
+        match = CREATE_TABLE_NAME.match(stmt) or COMMENT_TABLE.match(stmt)
+        if match:
+            units.setdefault(match.group(1), []).append(stmt)
+        else:
+            preamble.append(stmt)
+    if include_indexes:
+        for table, statements in index_statements.items():
+            units.setdefault(table, []).extend(statements)
+        index_statements = {}
+    return preamble, units, index_statements, foreign_keys
+
+def foreign_key_tables(stmt):
+    """Return the referencing and referenced table of an ALTER TABLE ... FOREIGN KEY statement."""
+    return STATEMENT_TABLE.match(stmt).group(1), REFERENCES_TABLE.search(stmt).group(1)
+
+def drop_tables(cursor, tables):
+    """Drop several tables with a single DROP TABLE ... CASCADE statement."""
+    if tables:
+        cursor.execute("DROP TABLE IF EXISTS " + ", ".join(f'"{table}"' for table in tables) + " CASCADE;")
+
+def apply_table_unit(connect, preamble, statements):
+    """Run one table's DDL unit in its own transaction and return the elapsed time."""
+    conn = connect()
+    try:
+        start_time = time()
+        with conn.cursor() as cursor:
+            for stmt in preamble + statements:
+                cursor.execute(stmt)
+        conn.commit()
+        return time() - start_time
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def apply_schema(connect, preamble, units, foreign_keys, workers):
+    """Apply per-table DDL units concurrently, then add the foreign keys in a final pass.
+
+    Units only depend on each other through foreign keys, so with those held
+    back every unit can run at once and the rebuild takes as long as the
+    slowest table. A foreign key is skipped (and logged) when either table it
+    links failed to build. Every unit is attempted; if any unit or the
+    foreign key pass failed, RuntimeError is raised once the pass is over.
+    Otherwise returns a mapping of table name to unit time.
+    """
+    unit_times = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(apply_table_unit, connect, preamble, statements): table
+            for table, statements in units.items()
+        }
+        for future in as_completed(futures):
+            table = futures[future]
+            try:
+                unit_times[table] = future.result()
+            except Exception as e:
+                logger.error(f"Error creating table|table={table}|error={str(e)}")
+                errors[table] = e
+                continue
+            logger.info(f"Created table|table={table}|statements={len(units[table])}|time={unit_times[table]:.2f}")
+
+    applicable = []
+    for stmt in foreign_keys:
+        missing = [table for table in foreign_key_tables(stmt) if table in units and table not in unit_times]
+        if missing:
+            logger.error(f"Skipped foreign key|tables={','.join(missing)}|reason=table not created")
+        else:
+            applicable.append(stmt)
+    if applicable:
+        try:
+            fk_time = apply_table_unit(connect, preamble, applicable)
+        except Exception as e:
+            logger.error(f"Error adding foreign keys|error={str(e)}")
+            errors["foreign keys"] = e
+        else:
+            logger.info(f"Added foreign keys|count={len(applicable)}|time={fk_time:.2f}")
+    if errors:
+        raise RuntimeError(f"Schema rebuild failed for {', '.join(sorted(errors))}") from next(iter(errors.values()))
+    return unit_times
+
+def build_table_indexes(connect, table, statements, maintenance_work_mem):
+    """Run one table's index and key statements in a single transaction and return the elapsed time."""
+    conn = connect()
+    try:
+        start_time = time()
+        with conn.cursor() as cursor:
+            cursor.execute("SET maintenance_work_mem = %s", (maintenance_work_mem,))
+            for stmt in statements:
+                cursor.execute(stmt)
+        conn.commit()
+        return time() - start_time
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def build_indexes(connect, index_statements, workers, maintenance_work_mem):
+    """Build indexes for several tables concurrently, one connection per table.
+
+    Returns a mapping of table name to index build time for the tables that
+    succeeded; failures are logged and left out.
+    """
+    index_times = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(build_table_indexes, connect, table, statements, maintenance_work_mem): table
+            for table, statements in index_statements.items()
+        }
+        for future in as_completed(futures):
+            table = futures[future]
+            try:
+                index_times[table] = future.result()
+            except Exception as e:
+                logger.error(f"Error building indexes|table={table}|error={str(e)}")
+                continue
+            logger.info(f"Built indexes|table={table}|indexes={len(index_statements[table])}|time={index_times[table]:.2f}")
+    return index_times
+
+def parse_column_types(schema):
+    """Return ``{table: {column: type}}`` from the CREATE TABLE statements of a schema script."""
+    column_types = {}
+    for stmt in split_statements(schema):
+        match = CREATE_TABLE.match(stmt)
+        if match:
+            table, body = match.groups()
+            column_types[table] = {
+                column: ' '.join(column_type.split()).upper()
+                for column, column_type in COLUMN_DEFINITION.findall(body)
+            }
+    return column_types
+
+def parse_not_null_columns(schema):
+    """Return ``{table: [column, ...]}`` of the columns declared NOT NULL in a schema script's CREATE TABLE statements."""
+    not_null = {}
+    for stmt in split_statements(schema):
+        match = CREATE_TABLE.match(stmt)
+        if match:
+            table, body = match.groups()
+            not_null[table] = COLUMN_NOT_NULL.findall(body)
+    return not_null
+
+def rewrite_schema(schema, table_names, column_names, column_fallback=None, name_fallback=None):
+    """Rename the quoted identifiers of an mdb-schema script in a single pass.
+
+    ``table_names`` maps MDB table names to new names and ``column_names``
+    maps each MDB table to its column renames; lookups fall back to a
+    case-insensitive match. Columns are resolved against the table the
+    statement is about (or the REFERENCES target), and columns with no
+    mapping go through ``column_fallback`` when given. Index and constraint
+    names go through ``name_fallback`` when given and are left as they are
+    otherwise.
+    """
+    tables = dict(table_names)
+    tables_folded = {name.lower(): new_name for name, new_name in tables.items()}
+    columns_folded = {table.lower(): columns for table, columns in column_names.items()}
+    pieces = []
+    position = 0
+    current = None
+    for match in SCHEMA_TOKENS.finditer(schema):
+        keyword, identifier, dot = match.groups()
+        if identifier is None:
+            if match.group(0) == ';':
+                current = None
+            continue
+        name = identifier.replace('""', '"')
+        keyword = keyword.lower() if keyword else None
+        if keyword in TABLE_KEYWORDS or (keyword == 'column' and dot):
+            current = name
+            new_name = tables.get(name) or tables_folded.get(name.lower(), name)
+        elif keyword in NAME_KEYWORDS:
+            new_name = name_fallback(name) if name_fallback else name
+        else:
+            columns = column_names.get(current) or columns_folded.get((current or '').lower(), {})
+            new_name = columns.get(name) or (column_fallback(name) if column_fallback else name)
+        pieces.append(schema[position:match.start(2) - 1])
+        pieces.append('"' + new_name.replace('"', '""') + '"')
+        position = match.end(2) + 1
+    pieces.append(schema[position:])
+    return ''.join(pieces)
@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
 import subprocess
-from io import StringIO
 from time import time
 import psycopg2
 import logging
+from copy_stream import copy_mdb_export
 
 logger = logging.getLogger(__name__)
 
@@ -16,18 +16,6 @@ PG_USER = "marche"
 PG_PASSWORD = "mc@24949981"  # Replace with actual password
 LOG_FILE = "import_log.csv"
 
-def export_table_to_csv(mdb_file, table_name):
-    # Placeholder for the export function; adjust as per your script
-    result = subprocess.run(
-        ["mdb-export", "-b", "strip", "-H", mdb_file, table_name],
-        capture_output=True,
-        text=True,
-        check=True
-    )
-    csv_data = result.stdout
-    row_count = len(csv_data.splitlines()) - 1 if csv_data.strip() else 0
-    return csv_data, row_count
-
 def clean_schema(schema):
     # Placeholder for schema cleaning; adjust as per your script
     lines = schema.splitlines()
@@ -78,17 +66,10 @@ def import_to_postgres(tables):
             logger.info(f"Starting import|table={table_lower}")
             start_time = time()
 
-            # Export using original table name
-            csv_data, row_count = export_table_to_csv(MDB_FILE, table)
-            if not csv_data.strip():
-                logger.info(f"Skipping empty table|table={table_lower}|rows=0")
-                continue
-
-            csv_buffer = StringIO(csv_data)
-            # Import using lowercase table name
-            cursor.copy_expert(
-                f"COPY \"{table_lower}\" FROM STDIN WITH (FORMAT csv, HEADER true)",
-                csv_buffer
+            # Export using original table name, streaming into the lowercase table
+            row_count = copy_mdb_export(
+                cursor, MDB_FILE, table,
+                f"COPY \"{table_lower}\" FROM STDIN WITH (FORMAT csv, HEADER true)"
             )
             conn.commit()
 
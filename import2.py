@@ -1,13 +1,13 @@
 #!/usr/bin/env python3
 import os
 import subprocess
-from io import StringIO
 from time import time
 import psycopg2
 import logging
 from dotenv import load_dotenv
 # Import the 'sub' function from the 're' module for regular expression substitution
 from re import sub
+from copy_stream import copy_mdb_export
 
 # Load environment variables from .env file
 load_dotenv()
@@ -44,20 +44,15 @@ def snake_case(s):
         sub('([A-Z]+)', r' \1',
         s.replace('-', ' '))).split()).lower()
 
-def export_table_to_csv(mdb_file, table_name):
-    """Export a table from an MDB file to CSV format."""
+def export_table_to_postgres(cursor, mdb_file, table_name, target_table):
+    """Stream a table from an MDB file into COPY and return the number of rows."""
     try:
-        result = subprocess.run(
-            ["mdb-export", "-b", "strip", "-H", mdb_file, table_name],
-            capture_output=True,
-            text=True,
-            check=True
+        return copy_mdb_export(
+            cursor, mdb_file, table_name,
+            f"COPY \"{target_table}\" FROM STDIN WITH (FORMAT csv, HEADER true)"
         )
-        csv_data = result.stdout
-        row_count = len(csv_data.splitlines()) - 1 if csv_data.strip() else 0
-        return csv_data, row_count
     except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to export table|table={table_name}|error={e.stderr}")
+        logger.error(f"Failed to export table|table={table_name}|error=mdb-export exited with {e.returncode}")
         raise
 
 def clean_schema(schema):
@@ -115,18 +110,8 @@ def import_to_postgres(mdb_file, tables):
             logger.info(f"Starting import|table={table_lower}")
             start_time = time()
 
-            # Export table data
-            csv_data, row_count = export_table_to_csv(mdb_file, table)
-            if not csv_data.strip():
-                logger.info(f"Skipping empty table|table={table_lower}|rows=0")
-                continue
-
-            csv_buffer = StringIO(csv_data)
-            # Import data into PostgreSQL
-            cursor.copy_expert(
-                f"COPY \"{table_lower}\" FROM STDIN WITH (FORMAT csv, HEADER true)",
-                csv_buffer
-            )
+            # Stream table data into PostgreSQL
+            row_count = export_table_to_postgres(cursor, mdb_file, table, table_lower)
             conn.commit()
 
             elapsed_time = time() - start_time
@@ -9,6 +9,10 @@ import tempfile
 import re
 from re import sub
 from tqdm import tqdm
+from mdb_meta import get_metadata
+from naming import NAME_MAP_FILE, build_name_map, save_name_map, snake_case
+from ddl import rewrite_schema
+from copy_stream import COPY_CHUNK_SIZE, HeaderRewritingReader
 
 # Load environment variables from .env file
 load_dotenv()
@@ -42,19 +46,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger()
 
-def snake_case(s):
-    """Convert a string to snake_case."""
-    return '_'.join(
-        sub('([A-Z][a-z]+)', r' \1',
-        sub('([A-Z]+)', r' \1',
-        s.replace('-', ' '))).split()).lower() \
-        .replace('rigth', 'right') \
-        .replace('dateof', 'date_of') \
-        .replace('leve_l', 'level') \
-        .replace('retailmark_down', 'retail_markdown') \
-        .replace('retail_mark_down', 'retail_markdown') \
-        .replace('paltform', 'platform') \
-
 def run_subprocess(command):
     """Run a subprocess command and return the output."""
     try:
@@ -66,107 +57,30 @@ def run_subprocess(command):
 
 def get_mdb_tables(mdb_file):
     """Fetch table names from the MDB file."""
-    return run_subprocess(["mdb-tables", "-1", mdb_file]).split("\n")
+    return get_metadata(mdb_file).tables()
 
 def get_table_row_counts(mdb_file):
     """Fetch row counts for each table in the MDB file."""
-    output = run_subprocess(["mdb-tables", "-r", mdb_file])
-    row_counts = {}
-    for line in output.split("\n"):
-        parts = line.split()
-        if len(parts) == 2:
-            table_name, count_str = parts
-            row_counts[table_name] = int(count_str)
-    return row_counts
+    return get_metadata(mdb_file).row_counts()
 
 def get_column_names(mdb_file, table):
     """Fetch column names for a specific table."""
-    output = run_subprocess(["mdb-describe", mdb_file, table])
-    return [line.split()[0] for line in output.split("\n")]
-
-# This function is expected to replace column names in a CREATE TABLE statement
-# with their snake_case equivalents or mapped names.
-def replace_column_names_in_create_table(statement, table, column_mappings):
-    """Replace column names in a CREATE TABLE statement."""
-    match = re.search(r'\(([^)]*)\)', statement)
-    if match:
-        columns_part = match.group(1)
-        columns = columns_part.split(',')
-        new_columns = []
-        for col_def in columns:
-            col_def = col_def.strip()
-            col_name_match = re.match(r'"([^"]+)"', col_def)
-            if col_name_match:
-                col_name = col_name_match.group(1)
-                new_col_name = column_mappings.get(col_name, snake_case(col_name))
-                col_def = col_def.replace(f'"{col_name}"', f'"{new_col_name}"')
-            new_columns.append(col_def)
-        new_columns_part = ', '.join(new_columns)
-        statement = statement.replace(columns_part, new_columns_part)
-    return statement
-
-# This function is expected to modify the header line of a CSV stream
-# by replacing the original headers with new headers
-# (e.g., snake_case or mapped names).
-def modify_header_stream(stream, new_header_line):
-    """Modify the header line of a CSV stream."""
-    yield new_header_line  # Yield the new header line
-    for line in stream:
-        yield line.decode()  # Yield the remaining lines as-is
-
-# This class is expected to wrap a generator and make it behave like a file object,
-# # which is required for PostgreSQL's COPY command.
-class GeneratorFile:
-    """Wrap a generator to make it behave like a file object."""
-    def __init__(self, generator):
-        self.generator = generator
-        self.iterator = iter(generator)
-
-    def read(self, size=-1):
-        try:
-            return next(self.iterator)
-        except StopIteration:
-            return ''
-
-    def readline(self):
-        return self.read()
-
-    def close(self):
-        pass
+    return get_metadata(mdb_file).columns(table)
 
 def clean_and_convert_schema(schema, mdb_to_xopti, column_mappings):
-    """Clean and adjust the schema for PostgreSQL compatibility."""
-    statements = re.split(r'\s*;\s*', schema)
-    cleaned_statements = []
-    for stmt in statements:
-        stmt = stmt.strip()
-        if not stmt:
-            continue
-        # Replace table names
-        for mdb_table, xopti_table in mdb_to_xopti.items():
-            stmt = re.sub(r'"' + re.escape(mdb_table) + r'"', f'"{xopti_table}"', stmt)
-        # Replace column names
-        if stmt.lower().startswith('create table'):
-            table_match = re.search(r'CREATE TABLE\s+"([^"]+)"', stmt, re.IGNORECASE)
-            if table_match:
-                table_name = table_match.group(1)
-                stmt = replace_column_names_in_create_table(stmt, table_name, column_mappings[table_name])
-            else:
-                logger.warning(f"Could not find table name in CREATE TABLE statement: {stmt}")  
-        cleaned_statements.append(stmt)
-    return ';'.join(cleaned_statements) + ';'
+    """Clean and adjust the schema for PostgreSQL compatibility, giving every identifier its final xOpti name."""
+    return rewrite_schema(schema, mdb_to_xopti, column_mappings, snake_case, snake_case)
 
 def import_data_with_header_conversion(cursor, mdb_file, table, xopti_table, column_mappings):
     """Import data with header conversion."""
-    process = subprocess.Popen(["mdb-export", "-b", "strip", "-H", mdb_file, table], stdout=subprocess.PIPE, bufsize=1)
+    process = subprocess.Popen(["mdb-export", "-b", "strip", "-H", mdb_file, table], stdout=subprocess.PIPE, bufsize=COPY_CHUNK_SIZE)
     try:
         header_line = process.stdout.readline().decode().strip()
         headers = header_line.split(',')
         new_headers = [column_mappings.get(header.strip(), snake_case(header.strip())) for header in headers]
         new_header_line = ','.join(new_headers) + '\n'
-        generator = modify_header_stream(process.stdout, new_header_line)
-        file_like = GeneratorFile(generator)
-        cursor.copy_expert(f"COPY \"{xopti_table}\" FROM STDIN WITH (FORMAT csv, HEADER true)", file_like)
+        file_like = HeaderRewritingReader(process.stdout, new_header_line)
+        cursor.copy_expert(f"COPY \"{xopti_table}\" FROM STDIN WITH (FORMAT csv, HEADER true)", file_like, size=COPY_CHUNK_SIZE)
     except Exception as e:
         process.kill()
         raise e
@@ -186,8 +100,10 @@ def import_to_postgres(tables):
         with conn.cursor() as cursor:
             # Get row counts and mappings
             row_counts = get_table_row_counts(MDB_FILE)
-            mdb_to_xopti = {table: snake_case(table) for table in tables}
-            column_mappings = {table: {col: snake_case(col) for col in get_column_names(MDB_FILE, table)} for table in tables}
+            name_map = build_name_map({table: get_column_names(MDB_FILE, table) for table in tables})
+            save_name_map(NAME_MAP_FILE, name_map)
+            mdb_to_xopti = name_map["tables"]
+            column_mappings = name_map["columns"]
 
             # Empty existing tables
             for table in tables:
@@ -1,33 +1,98 @@
 from dotenv import load_dotenv
 import os
 import subprocess
-import psycopg2
 from io import StringIO
 import logging
 from time import time
 import tempfile
+import shutil
 import re
 from re import sub
+import hashlib
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
+from mdb_meta import file_key, get_metadata
+from naming import NAME_MAP_FILE, build_name_map, save_name_map, snake_case
+from copy_stream import (
+    COPY_CHUNK_SIZE, CsvRecordTap, HashingStream, HeaderRewritingReader, IterableReader, MeteredIterable, MeteredStream,
+    RecordCountingStream
+)
+from mdb_reader import encode_csv_rows, open_mdb
+from pg_binary import binary_copy_chunks, csv_records, encoders_for, parse_csv_batches, parser_for
+from ddl import parse_column_types, parse_not_null_columns
+import argparse
+import io
+import json
+from tracing import get_tracer
+from checkpoint import CHECKPOINT_FILE, CheckpointJournal
+from verify import VERIFY_AGGREGATES, ColumnSums, unmatched_aggregates, verify_copy
+from async_copy import run_async_loads
+from quarantine import (
+    REJECT_MODE, Rejects, copy_with_quarantine, discard_held_rejects, ensure_rejects_table, write_held_rejects
+)
+from transforms import TRANSFORMS, shutdown_pool, transform_batches
+from multi_source import (
+    SHARED_TABLES, SOURCE_COLUMN, MergedExport, insert_distinct, keyed_tables, resolve_sources, source_label,
+    unprepared_source_tables
+)
+from pg_pool import ConnectionPool, commit_durably, existing_tables, session_options
+from swap import swap_blockers, swap_table
+from partitions import (
+    PARTITION_COLUMN, PARTITION_TABLES, clear_partitions_since, ensure_partitions, is_partitioned,
+    last_partition_month, partition_cutoff, partitioned_tables
+)
+from incremental import (
+    create_stage_table, export_digest, load_state, primary_key_columns, save_state, table_columns,
+    truncate_closure, upsert_from_stage
+)
 
 # Load environment variables
 load_dotenv()
 
 # Get configuration from environment variables
-MDB_FILE = os.getenv("MDB_FILE")
+# MDB_FILES lists several sources (paths or globs, comma-separated); the first one supplies the catalog
+MDB_SOURCES = resolve_sources(os.getenv("MDB_FILES") or os.getenv("MDB_FILE") or "")
+MDB_FILE = MDB_SOURCES[0] if MDB_SOURCES else None
+MULTI_SOURCE = len(MDB_SOURCES) > 1 or bool(SOURCE_COLUMN)
 PG_HOST = os.getenv("PG_HOST")
 PG_PORT = int(os.getenv("PG_PORT", 5432))
 PG_DB = os.getenv("PG_DB")
 PG_USER = os.getenv("PG_USER")
 PG_PASSWORD = os.getenv("PG_PASSWORD")
 LOG_FILE = os.getenv("LOG_FILE", "import_log.csv")
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", 1))
+MDB_READER = os.getenv("MDB_READER", "mdb-export")
+COPY_FORMAT = os.getenv("COPY_FORMAT", "csv")
+EXPORT_DATETIME_OPTION = os.getenv("EXPORT_DATETIME_OPTION", "-T")
+EXPORT_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+INCREMENTAL = os.getenv("INCREMENTAL", "0") == "1"
+SYNC_STATE_FILE = os.getenv("SYNC_STATE_FILE", "sync_state.json")
+# xOpti (snake_case) names, as produced by the name map
+APPEND_TABLES = [t.strip() for t in os.getenv("APPEND_TABLES", "tx_header,tx_details").split(",") if t.strip()]
+APPEND_DATE_COLUMN = os.getenv("APPEND_DATE_COLUMN", "date_of_entry")
+APPEND_LOOKBACK_DAYS = int(os.getenv("APPEND_LOOKBACK_DAYS", 7))
+LOAD_MODE = os.getenv("LOAD_MODE", "truncate")
+SWAP_LOCK_TIMEOUT = os.getenv("SWAP_LOCK_TIMEOUT", "5s")
+SWAP_SET_LOGGED = os.getenv("SWAP_SET_LOGGED", "1") == "1"
+MAINTENANCE_WORK_MEM = os.getenv("MAINTENANCE_WORK_MEM", "1GB")
+# "threads" couples each export and COPY in one worker thread; "async" overlaps them on one event loop
+COPY_PIPELINE = os.getenv("COPY_PIPELINE", "threads")
+# Skip tables whose content hash matches their last load: off, pages (native page digest) or export (mdb-export bytes)
+CHANGE_DETECTION = os.getenv("CHANGE_DETECTION", "off")
+# Where CHANGE_DETECTION=export keeps the exports it hashed, so changed tables load without a second mdb-export
+EXPORT_SPOOL_DIR = os.getenv("EXPORT_SPOOL_DIR") or None
 
 # Validate environment variables
 def validate_env_vars():
-    required_vars = ["MDB_FILE", "PG_HOST", "PG_PORT", "PG_DB", "PG_USER", "PG_PASSWORD"]
+    required_vars = ["PG_HOST", "PG_PORT", "PG_DB", "PG_USER", "PG_PASSWORD"]
     for var in required_vars:
         if not os.getenv(var):
             raise ValueError(f"Environment variable {var} is not set.")
+    if not MDB_SOURCES:
+        raise ValueError("Environment variable MDB_FILE or MDB_FILES is not set.")
+    if CHANGE_DETECTION not in ("off", "pages", "export"):
+        raise ValueError(f"CHANGE_DETECTION must be off, pages or export, not {CHANGE_DETECTION}.")
 
 validate_env_vars()
 
@@ -41,143 +106,818 @@ logging.basicConfig(
     ]
 )
 logger = logging.getLogger()
-
-def snake_case(s):
-    """Convert a string to snake_case."""
-    return '_'.join(
-        sub('([A-Z][a-z]+)', r' \1',
-        sub('([A-Z]+)', r' \1',
-        s.replace('-', ' '))).split()).lower() \
-        .replace('rigth', 'right') \
-        .replace('dateof', 'date_of') \
-        .replace('leve_l', 'level') \
-        .replace('retailmark_down', 'retail_markdown') \
-        .replace('retail_mark_down', 'retail_markdown') \
-        .replace('paltform', 'platform')
-
-def run_subprocess(command):
-    """Run a subprocess command and return the output."""
-    try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Subprocess failed|command={' '.join(command)}|error={e.stderr}")
-        raise
+tracer = get_tracer()
 
 def get_mdb_tables(mdb_file):
     """Fetch table names from the MDB file."""
-    return run_subprocess(["mdb-tables", "-1", mdb_file]).split("\n")
+    return get_metadata(mdb_file).tables()
 
 def get_table_row_counts(mdb_file):
     """Fetch row counts for each table in the MDB file."""
-    output = run_subprocess(["mdb-tables", "-r", mdb_file])
+    return get_metadata(mdb_file).row_counts()
+
+def get_source_row_counts(sources):
+    """Total the row counts of each table over every source."""
     row_counts = {}
-    for line in output.split("\n"):
-        parts = line.split()
-        if len(parts) == 2:
-            table_name, count_str = parts
-            row_counts[table_name] = int(count_str)
+    for source in sources:
+        for table, count in get_table_row_counts(source).items():
+            row_counts[table] = row_counts.get(table, 0) + count
     return row_counts
 
 def get_column_names(mdb_file, table):
     """Fetch column names for a specific table."""
-    output = run_subprocess(["mdb-describe", mdb_file, table])
-    return [line.split()[0] for line in output.split("\n")]
-
-def modify_header_stream(stream, new_header_line):
-    """Modify the header line of a CSV stream."""
-    yield new_header_line  # Yield the new header line
-    for line in stream:
-        yield line.decode()  # Yield the remaining lines as-is
-
-class GeneratorFile:
-    """Wrap a generator to make it behave like a file object."""
-    def __init__(self, generator):
-        self.generator = generator
-        self.iterator = iter(generator)
-
-    def read(self, size=-1):
-        try:
-            return next(self.iterator)
-        except StopIteration:
-            return ''
+    return get_metadata(mdb_file).columns(table)
+
+def get_column_types(mdb_file, table):
+    """Fetch the PostgreSQL column types mdb-schema gives a table, keyed by lowercased column name."""
+    metadata = get_metadata(mdb_file)
+    schema_types = metadata.cached("column_types", lambda: parse_column_types(metadata.schema()))
+    for schema_table, types in schema_types.items():
+        if schema_table.lower() == table.lower():
+            return {column.lower(): column_type for column, column_type in types.items()}
+    raise ValueError(f"Table {table} not found in mdb-schema output")
+
+def get_not_null_columns(mdb_file, table):
+    """Fetch the lowercased names of a table's NOT NULL columns from the mdb-schema output."""
+    metadata = get_metadata(mdb_file)
+    schema_not_null = metadata.cached("not_null_columns", lambda: parse_not_null_columns(metadata.schema()))
+    for schema_table, columns in schema_not_null.items():
+        if schema_table.lower() == table.lower():
+            return {column.lower() for column in columns}
+    raise ValueError(f"Table {table} not found in mdb-schema output")
 
-    def readline(self):
-        return self.read()
+def copy_filter(where):
+    """Return a COPY ... WHERE clause (PostgreSQL 12+) for an optional row filter."""
+    return f" WHERE {where}" if where else ""
 
-    def close(self):
-        pass
+def run_copy(cursor, sql, xopti_table, source, stream, start_time, counter=None):
+    """Run COPY from ``stream``, record stage spans from the meters and return the rows copied (``counter``'s if the driver reports none)."""
+    stream = MeteredStream(stream)
+    # Waits before the COPY, such as the header read, already fall within copy_start - start_time
+    source_wait = source.wait_time
+    copy_start = time()
+    cursor.copy_expert(sql, stream, size=COPY_CHUNK_SIZE)
+    copy_time = time() - copy_start
+    source_wait = source.wait_time - source_wait
+    rows = cursor.rowcount if cursor.rowcount >= 0 else counter.records if counter is not None else None
+    tracer.record("extract", xopti_table, copy_start - start_time + source_wait, bytes=getattr(source, "bytes", None), rows=rows)
+    tracer.record("transform", xopti_table, stream.wait_time - source_wait, bytes=stream.bytes, rows=rows)
+    tracer.record("copy", xopti_table, copy_time - stream.wait_time, bytes=stream.bytes, rows=rows)
+    return rows
 
-def import_data_with_header_conversion(cursor, mdb_file, table, xopti_table, column_mappings):
-    """Import data with header conversion."""
-    process = subprocess.Popen(["mdb-export", "-b", "strip", "-H", mdb_file, table], stdout=subprocess.PIPE, bufsize=1)
+# Spooled exports by MDB table, consumed by the first load of the table
+export_spools = {}
+
+def import_data_with_header_conversion(cursor, mdb_file, table, xopti_table, column_mappings, digest=None, where=None, sums=None, rejects=None):
+    """Import data with header conversion, optionally hashing rows into ``digest``, summing into ``sums`` and quarantining into ``rejects``."""
+    start_time = time()
+    spool = export_spools.pop(table, None) if mdb_file == MDB_FILE else None
+    if spool is not None:
+        process = None
+        export = open(spool, "rb")
+    else:
+        process = subprocess.Popen(["mdb-export", "-b", "strip", "-H", mdb_file, table], stdout=subprocess.PIPE, bufsize=COPY_CHUNK_SIZE)
+        export = process.stdout
     try:
-        header_line = process.stdout.readline().decode().strip()
+        source = MeteredStream(export)
+        header_line = source.readline().decode().strip()
         headers = header_line.split(',')
         new_headers = [column_mappings.get(header.strip(), snake_case(header.strip())) for header in headers]
         new_header_line = ','.join(new_headers) + '\n'
-        generator = modify_header_stream(process.stdout, new_header_line)
-        file_like = GeneratorFile(generator)
-        cursor.copy_expert(f"COPY \"{xopti_table}\" FROM STDIN WITH (FORMAT csv, HEADER true)", file_like)
+        stream = HashingStream(source, digest) if digest is not None else source
+        if rejects is not None:
+            if sums is not None:
+                sums.bind(new_headers)
+                stream = CsvRecordTap(stream, sums.add)
+            columns = ', '.join(f'"{header}"' for header in new_headers)
+            with tracer.span("copy", xopti_table) as span:
+                span.rows = copy_with_quarantine(
+                    cursor, f"COPY \"{xopti_table}\" ({columns}) FROM STDIN WITH (FORMAT csv){copy_filter(where)}", stream, rejects
+                )
+            return span.rows
+        # A filtered COPY keeps fewer rows than it is sent, so only an unfiltered one can fall back to counting them
+        counter = None
+        if where is None:
+            counter = stream = RecordCountingStream(stream)
+        file_like = HeaderRewritingReader(stream, new_header_line)
+        if sums is not None:
+            file_like = CsvRecordTap(file_like, sums.add, on_header=sums.bind)
+        return run_copy(cursor, f"COPY \"{xopti_table}\" FROM STDIN WITH (FORMAT csv, HEADER true){copy_filter(where)}", xopti_table, source, file_like, start_time, counter)
     except Exception as e:
-        process.kill()
+        if process:
+            process.kill()
         raise e
     finally:
+        if process is None:
+            export.close()
+            os.remove(spool)
+        else:
+            process.wait()
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(process.returncode, process.args)
+
+def open_typed_export(mdb_file, table, column_types):
+    """Start reading a table as typed row batches; return ``(process, source, names, batches)``, ``process`` None for the native reader."""
+    if MDB_READER == "native":
+        names = open_mdb(mdb_file).table(table).column_names
+        source = batches = MeteredIterable(open_mdb(mdb_file).iter_batches(table))
+        return None, source, names, batches
+    process = subprocess.Popen(
+        ["mdb-export", "-b", "strip", "-H", EXPORT_DATETIME_OPTION, EXPORT_DATETIME_FORMAT, mdb_file, table],
+        stdout=subprocess.PIPE, bufsize=COPY_CHUNK_SIZE
+    )
+    try:
+        source = records = MeteredIterable(
+            csv_records(io.TextIOWrapper(process.stdout, encoding="utf-8", newline=""))
+        )
+        names = [header.strip() for header in next(records, [])]
+        parsers = [parser_for(column_types[name.lower()], EXPORT_DATETIME_FORMAT) for name in names]
+    except Exception:
+        process.kill()
         process.wait()
-        if process.returncode != 0:
-            raise subprocess.CalledProcessError(process.returncode, process.args)
-
-def import_to_postgres(tables):
-    with psycopg2.connect(
-        host=PG_HOST,
-        port=PG_PORT,
-        database=PG_DB,
-        user=PG_USER,
-        password=PG_PASSWORD
-    ) as conn:
-        with conn.cursor() as cursor:
-            # Get row counts and mappings
-            row_counts = get_table_row_counts(MDB_FILE)
-            mdb_to_xopti = {table: snake_case(table) for table in tables}
-            column_mappings = {table: {col: snake_case(col) for col in get_column_names(MDB_FILE, table)} for table in tables}
-
-            # Empty existing tables
-            for table in tables:
-                xopti_table = mdb_to_xopti[table]
-                cursor.execute("SELECT EXISTS (SELECT FROM pg_tables WHERE tablename = %s)", (xopti_table,))
-                if cursor.fetchone()[0]:
-                    cursor.execute(f"TRUNCATE TABLE \"{xopti_table}\" CASCADE;")
-                logger.info(f"Truncated table|table={xopti_table}")
-
-            # Import new data
-            for table in tqdm(tables, desc="Importing tables"):
-                tqdm.set_description(f"Importing {mdb_to_xopti[table]}")
-                xopti_table = mdb_to_xopti[table]
-                logger.info(f"Starting import|table={xopti_table}")
-                start_time = time()
+        raise
+    return process, source, names, parse_csv_batches(records, parsers)
+
+def import_data_rows(cursor, mdb_file, table, xopti_table, column_mappings, digest=None, where=None, sums=None, rejects=None, binary=False):
+    """Import typed row batches, cleansed by the TRANSFORMS stage, as CSV or binary COPY."""
+    start_time = time()
+    # The native reader alone needs no schema types for a plain CSV COPY
+    column_types = get_column_types(mdb_file, table) if binary or TRANSFORMS else None
+    process, source, names, batches = open_typed_export(mdb_file, table, column_types)
+    try:
+        if TRANSFORMS:
+            not_null = get_not_null_columns(mdb_file, table)
+            batches = transform_batches(
+                batches, [column_types[name.lower()] for name in names], [name.lower() in not_null for name in names]
+            )
+        targets = [column_mappings.get(name, snake_case(name)) for name in names]
+        columns = ', '.join(f'"{name}"' for name in targets)
+        if sums is not None:
+            sums.bind(targets)
+            batches = sums.tap(batches)
+        if binary:
+            stream = IterableReader(binary_copy_chunks(batches, encoders_for([column_types[name.lower()] for name in names])))
+            copy_sql = f"COPY \"{xopti_table}\" ({columns}) FROM STDIN WITH (FORMAT binary){copy_filter(where)}"
+        else:
+            stream = IterableReader(encode_csv_rows(batch) for batch in batches)
+            copy_sql = f"COPY \"{xopti_table}\" ({columns}) FROM STDIN WITH (FORMAT csv){copy_filter(where)}"
+        counter = None
+        if where is None and not binary:
+            counter = stream = RecordCountingStream(stream)
+        if digest is not None:
+            stream = HashingStream(stream, digest)
+        if rejects is not None:
+            with tracer.span("copy", xopti_table) as span:
+                span.rows = copy_with_quarantine(cursor, copy_sql, stream, rejects)
+            return span.rows
+        return run_copy(cursor, copy_sql, xopti_table, source, stream, start_time, counter)
+    except Exception as e:
+        if process:
+            process.kill()
+        raise e
+    finally:
+        if process:
+            process.wait()
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(process.returncode, process.args)
+
+def import_data_merged(cursor, table, xopti_table, column_mappings, where=None, sums=None, rejects=None):
+    """Import one table from every MDB source at once through a single COPY, tagging rows with SOURCE_COLUMN if set."""
+    start_time = time()
+    export = MergedExport(MDB_SOURCES, table, label_sources=bool(SOURCE_COLUMN))
+    try:
+        headers = export.start()
+        names = [column_mappings.get(header, snake_case(header)) for header in headers]
+        if SOURCE_COLUMN:
+            names.append(SOURCE_COLUMN)
+        columns = ', '.join(f'"{name}"' for name in names)
+        copy_sql = f"COPY \"{xopti_table}\" ({columns}) FROM STDIN WITH (FORMAT csv){copy_filter(where)}"
+        source = MeteredIterable(export.chunks())
+        stream = IterableReader(source)
+        counter = None
+        if where is None:
+            counter = stream = RecordCountingStream(stream)
+        if sums is not None:
+            sums.bind(names)
+            stream = CsvRecordTap(stream, sums.add)
+        if rejects is not None:
+            with tracer.span("copy", xopti_table) as span:
+                span.rows = copy_with_quarantine(cursor, copy_sql, stream, rejects)
+            return span.rows
+        return run_copy(cursor, copy_sql, xopti_table, source, stream, start_time, counter)
+    finally:
+        export.close()
+
+def copies_raw_export():
+    """Whether copy_table streams the plain mdb-export bytes, as export_digest reads them."""
+    return not MULTI_SOURCE and COPY_FORMAT == "csv" and MDB_READER == "mdb-export" and not TRANSFORMS
+
+def copy_table(cursor, mdb_file, table, xopti_table, column_mappings, digest=None, where=None, sums=None, rejects=None):
+    """COPY one MDB table into xOpti using the format and reader selected by COPY_FORMAT and MDB_READER; return the rows copied."""
+    if rejects is not None and COPY_FORMAT != "csv":
+        raise ValueError("REJECT_MODE quarantines CSV rows and needs COPY_FORMAT=csv")
+    if MULTI_SOURCE:
+        if COPY_FORMAT != "csv" or MDB_READER != "mdb-export" or TRANSFORMS:
+            raise ValueError("MDB_FILES and SOURCE_COLUMN merge mdb-export CSV and need COPY_FORMAT=csv, MDB_READER=mdb-export and no TRANSFORMS")
+        return import_data_merged(cursor, table, xopti_table, column_mappings, where, sums, rejects)
+    if COPY_FORMAT == "binary":
+        return import_data_rows(cursor, mdb_file, table, xopti_table, column_mappings, digest, where, sums, binary=True)
+    if MDB_READER == "native" or TRANSFORMS:
+        return import_data_rows(cursor, mdb_file, table, xopti_table, column_mappings, digest, where, sums, rejects)
+    return import_data_with_header_conversion(cursor, mdb_file, table, xopti_table, column_mappings, digest, where, sums, rejects)
+
+def copy_verified(cursor, table, target, xopti_table, column_mappings, expected, digest=None, where=None):
+    """COPY a table into ``target`` (the live table or a shadow/stage copy of it) and verify it against the source."""
+    columns = VERIFY_AGGREGATES.get(xopti_table) if where is None else None
+    sums = ColumnSums(columns) if columns else None
+    rejects = Rejects(xopti_table) if REJECT_MODE != "off" else None
+    # Shared tables repeat the same rows in every source, so they are staged and de-duplicated on their key
+    shared = len(MDB_SOURCES) > 1 and xopti_table in SHARED_TABLES
+    load_target = create_stage_table(cursor, target) if shared else target
+    copied = copy_table(cursor, MDB_FILE, table, load_target, column_mappings, digest, where, sums, rejects)
+    if rejects is not None and rejects.count:
+        logger.warning(f"Quarantined rows|table={xopti_table}|rows={rejects.count}|mode={REJECT_MODE}")
+    with tracer.span("verify", xopti_table):
+        verify_copy(
+            cursor, xopti_table, load_target, copied, expected, sums,
+            filtered=where is not None, rejected=rejects.count if rejects is not None else 0
+        )
+    if shared:
+        columns = table_columns(cursor, load_target)
+        key = primary_key_columns(cursor, xopti_table) or [column for column in columns if column != SOURCE_COLUMN]
+        inserted = insert_distinct(cursor, load_target, target, key, columns, prefer=SOURCE_COLUMN or None)
+        logger.info(f"Deduplicated shared table|table={xopti_table}|rows={inserted}|duplicates={(copied or 0) - inserted}")
+        copied = inserted
+    return copied
+
+# One connection for the run itself plus one per import worker
+pool = ConnectionPool(
+    max(IMPORT_WORKERS, 1) + 1,
+    host=PG_HOST,
+    port=PG_PORT,
+    database=PG_DB,
+    user=PG_USER,
+    password=PG_PASSWORD
+)
+
+def connect(label=None):
+    """Check out a pooled connection to the xOpti database, tagged with ``label`` in its application_name."""
+    return pool.connection(label)
+
+def run_in_transaction(work, *args, trace_table=None):
+    """Run ``work(cursor, *args)`` on a pooled connection, committing on success and rolling back on failure."""
+    with connect(trace_table) as conn:
+        try:
+            with conn.cursor() as cursor:
+                result = work(cursor, *args)
+            with tracer.span("commit", trace_table):
+                commit_durably(conn)
+            write_held_rejects()
+            return result
+        except Exception:
+            conn.rollback()
+            discard_held_rejects()
+            raise
+
+def import_table(table, xopti_table, column_mappings, expected, where=None):
+    """Import and verify one table over its own connection, committing or rolling back on its own."""
+    start_time = time()
+    run_in_transaction(copy_verified, table, xopti_table, xopti_table, column_mappings, expected, None, where, trace_table=xopti_table)
+    return time() - start_time
+
+def dependency_levels(cursor, tables):
+    """Group ``tables`` into levels whose tables only reference tables of earlier levels; cycles share the last level."""
+    cursor.execute("""
+        SELECT conrelid::regclass::text, confrelid::regclass::text
+        FROM pg_constraint
+        WHERE contype = 'f' AND conrelid <> confrelid
+    """)
+    parents = {table: set() for table in tables}
+    for table, referenced in cursor.fetchall():
+        table, referenced = table.strip('"'), referenced.strip('"')
+        if table in parents and referenced in parents and table != referenced:
+            parents[table].add(referenced)
+    levels = []
+    placed = set()
+    while len(placed) < len(parents):
+        level = {table for table, referenced in parents.items() if table not in placed and referenced <= placed}
+        if not level:
+            level = set(parents) - placed
+        levels.append(sorted(level))
+        placed |= level
+    return levels
+
+def load_levels(cursor, tables, mdb_to_xopti):
+    """Split tables into foreign key levels, parents first, keeping the given order within each level."""
+    levels = dependency_levels(cursor, {mdb_to_xopti[table] for table in tables})
+    level_of = {xopti_table: i for i, level in enumerate(levels) for xopti_table in level}
+    grouped = [[] for _ in levels]
+    for table in tables:
+        grouped[level_of[mdb_to_xopti[table]]].append(table)
+    return grouped
+
+def import_tables_parallel(levels, mdb_to_xopti, row_counts, workers, load):
+    """Run ``load(table)`` concurrently, one level at a time and largest first, and return the results of those that succeeded."""
+    results = {}
+    total = sum(len(level) for level in levels)
+    with ThreadPoolExecutor(max_workers=workers) as executor, tqdm(total=total, desc="Importing tables") as progress:
+        for level in levels:
+            futures = {}
+            for table in sorted(level, key=lambda table: row_counts.get(table, 0), reverse=True):
+                logger.info(f"Starting import|table={mdb_to_xopti[table]}")
+                futures[executor.submit(load, table)] = table
+            for future in as_completed(futures):
+                table = futures[future]
+                progress.update(1)
                 try:
-                    import_data_with_header_conversion(cursor, MDB_FILE, table, xopti_table, column_mappings[table])
+                    results[table] = future.result()
                 except Exception as e:
                     logger.error(f"Error importing table {table}: {str(e)}")
-                    continue
-                elapsed_time = time() - start_time
-                row_count = row_counts.get(table, 0)
-                logger.info(f"Imported data|table={xopti_table}|rows={row_count}|time={elapsed_time:.2f}")
+    return results
+
+def plan_incremental(cursor, tables, mdb_to_xopti, row_counts, state):
+    """Decide for each table whether it is skipped, appended to, or reloaded in full."""
+    actions = {}
+    for table in tables:
+        xopti_table = mdb_to_xopti[table]
+        previous = state.get(xopti_table)
+        rows = row_counts.get(table, 0)
+        if previous is None:
+            actions[table] = "reload"
+        elif xopti_table in APPEND_TABLES and previous.get("rows") != rows:
+            actions[table] = "append" if previous.get("max_date") else "reload"
+        elif previous.get("rows") != rows:
+            actions[table] = "reload"
+        else:
+            # Append tables too: an edit or delete that keeps the row count only shows up in the hash
+            actions[table] = "skip" if export_digest(MDB_FILE, table) == previous.get("hash") else "reload"
+
+    # TRUNCATE ... CASCADE also empties referencing tables, so those have to be reloaded too
+    reloaded = {mdb_to_xopti[table] for table, action in actions.items() if action == "reload"}
+    cascaded = truncate_closure(cursor, reloaded)
+    for table in tables:
+        if mdb_to_xopti[table] in cascaded and actions[table] != "reload":
+            logger.info(f"Reloading table emptied by cascade|table={mdb_to_xopti[table]}")
+            actions[table] = "reload"
+    return actions
+
+def sync_table(cursor, table, xopti_table, column_mappings, action, previous, row_count):
+    """Append to or reload one table inside the caller's transaction and return its new fingerprint."""
+    fingerprint = {"rows": row_count}
+    # plan_incremental compares against export_digest, which only the plain mdb-export COPY streams byte for byte
+    raw_export = copies_raw_export()
+    digest = hashlib.sha256() if raw_export else None
+    if action == "append":
+        since = datetime.fromisoformat(previous["max_date"]) - timedelta(days=APPEND_LOOKBACK_DAYS)
+        stage_table = create_stage_table(cursor, xopti_table)
+        # Rows older than the lookback window are dropped by COPY ... WHERE and never reach the stage
+        where = f"\"{APPEND_DATE_COLUMN}\" >= '{since.isoformat()}'"
+        staged = copy_verified(cursor, table, stage_table, xopti_table, column_mappings, row_count, digest, where)
+        rows_upserted, max_date = upsert_from_stage(cursor, xopti_table, stage_table, APPEND_DATE_COLUMN)
+        # Every staged row is inserted or updated, so the upsert has to account for the filtered count
+        verify_copy(cursor, xopti_table, xopti_table, rows_upserted, staged)
+        fingerprint["max_date"] = max_date.isoformat() if max_date else previous["max_date"]
+        logger.info(f"Upserted rows|table={xopti_table}|since={since.isoformat()}|staged={staged}|rows={rows_upserted}")
+    else:
+        copy_verified(cursor, table, xopti_table, xopti_table, column_mappings, row_count, digest)
+        if xopti_table in APPEND_TABLES:
+            cursor.execute(f'SELECT max("{APPEND_DATE_COLUMN}") FROM "{xopti_table}"')
+            max_date = cursor.fetchone()[0]
+            fingerprint["max_date"] = max_date.isoformat() if max_date else None
+    # Append tables are hashed too, so an edit or delete that keeps the row count still triggers a reload
+    fingerprint["hash"] = digest.hexdigest() if raw_export else export_digest(MDB_FILE, table)
+    return fingerprint
+
+def import_incremental(cursor, tables, mdb_to_xopti, column_mappings, row_counts):
+    """Sync only the tables whose fingerprint changed since the previous run."""
+    state = load_state(SYNC_STATE_FILE)
+    unknown = set(APPEND_TABLES) - {mdb_to_xopti[table] for table in tables}
+    if unknown:
+        logger.warning(f"APPEND_TABLES not among the imported tables|tables={','.join(sorted(unknown))}")
+    for table in tables:
+        if mdb_to_xopti[table] in APPEND_TABLES and APPEND_DATE_COLUMN not in column_mappings[table].values():
+            logger.warning(f"APPEND_DATE_COLUMN not in append table|table={mdb_to_xopti[table]}|column={APPEND_DATE_COLUMN}")
+    actions = plan_incremental(cursor, tables, mdb_to_xopti, row_counts, state)
+    for table, action in actions.items():
+        if action == "skip":
+            logger.info(f"Skipped unchanged table|table={mdb_to_xopti[table]}")
+        elif action == "reload":
+            # Forget the old fingerprint so a failed reload is not mistaken for unchanged next run
+            state.pop(mdb_to_xopti[table], None)
+            with tracer.span("truncate", mdb_to_xopti[table]):
+                cursor.execute(f"TRUNCATE TABLE \"{mdb_to_xopti[table]}\" CASCADE;")
+            logger.info(f"Truncated table|table={mdb_to_xopti[table]}")
+    cursor.connection.commit()
+    save_state(SYNC_STATE_FILE, state)
+
+    pending = [table for table in tables if actions[table] != "skip"]
+
+    def load(table):
+        xopti_table = mdb_to_xopti[table]
+        start_time = time()
+        state[xopti_table] = run_in_transaction(
+            sync_table, table, xopti_table, column_mappings[table],
+            actions[table], state.get(xopti_table), row_counts.get(table, 0),
+            trace_table=xopti_table
+        )
+        elapsed_time = time() - start_time
+        logger.info(f"Synced data|table={xopti_table}|mode={actions[table]}|rows={row_counts.get(table, 0)}|time={elapsed_time:.2f}")
+
+    try:
+        levels = load_levels(cursor, pending, mdb_to_xopti)
+        import_tables_parallel(levels, mdb_to_xopti, row_counts, max(IMPORT_WORKERS, 1), load)
+    finally:
+        save_state(SYNC_STATE_FILE, state)
+
+def plan_partition_reloads(cursor, tables, mdb_to_xopti):
+    """Return ``{table: copy filter}`` for partitioned tables that only need their months since the cutoff reloaded."""
+    since = partition_cutoff()
+    if since is None:
+        return {}
+    candidates = [
+        table for table in tables
+        if mdb_to_xopti[table] in PARTITION_TABLES and is_partitioned(cursor, mdb_to_xopti[table])
+    ]
+    # A table emptied by another table's TRUNCATE ... CASCADE has to be reloaded in full
+    others = {mdb_to_xopti[table] for table in tables if table not in candidates}
+    cascaded = truncate_closure(cursor, others)
+    filters = {}
+    for table in candidates:
+        if mdb_to_xopti[table] in cascaded:
+            logger.info(f"Reloading partitioned table in full|table={mdb_to_xopti[table]}|reason=cascade")
+        else:
+            filters[table] = f"\"{PARTITION_COLUMN}\" >= '{since.isoformat()}'"
+    return filters
+
+def clear_recent_partitions(cursor, xopti_table):
+    """Empty the partitions a cutoff reload refills and create any months it needs."""
+    since = partition_cutoff()
+    truncated = clear_partitions_since(cursor, xopti_table, PARTITION_COLUMN, since)
+    ensure_partitions(cursor, xopti_table, since, last_partition_month())
+    logger.info(f"Truncated partitions|table={xopti_table}|since={since.isoformat()}|partitions={len(truncated)}")
+
+def import_swap(cursor, tables, mdb_to_xopti, column_mappings, row_counts, checkpointed):
+    """Reload tables through unlogged shadow copies, truncating only the ones a swap cannot replace."""
+    swapped = []
+    fallback = []
+    existing = existing_tables(cursor, [mdb_to_xopti[table] for table in tables])
+    # A shadow built with LIKE is a plain table, and swapping it in would drop every partition
+    partitioned = partitioned_tables(cursor, [mdb_to_xopti[table] for table in tables])
+    for table in tables:
+        xopti_table = mdb_to_xopti[table]
+        if xopti_table not in existing:
+            logger.error(f"Skipped missing table|table={xopti_table}")
+            continue
+        if xopti_table in partitioned:
+            logger.warning(f"Falling back to truncate|table={xopti_table}|reason=partitioned")
+            fallback.append(table)
+            continue
+        blockers = swap_blockers(cursor, xopti_table)
+        if blockers:
+            logger.warning(f"Falling back to truncate|table={xopti_table}|blockers={','.join(blockers)}")
+            fallback.append(table)
+        else:
+            swapped.append(table)
+
+    # TRUNCATE ... CASCADE on a fallback table also empties the tables referencing it
+    copy_filters = plan_partition_reloads(cursor, fallback, mdb_to_xopti)
+    fallback_tables = {mdb_to_xopti[table] for table in fallback if table not in copy_filters}
+    for xopti_table in sorted(truncate_closure(cursor, fallback_tables) - fallback_tables):
+        logger.warning(f"Emptied by cascade until swapped|table={xopti_table}")
+    for table in fallback:
+        xopti_table = mdb_to_xopti[table]
+        with tracer.span("truncate", xopti_table):
+            if table in copy_filters:
+                clear_recent_partitions(cursor, xopti_table)
+            else:
+                cursor.execute(f"TRUNCATE TABLE \"{xopti_table}\" CASCADE;")
+    cursor.connection.commit()
+
+    def swap(table):
+        xopti_table = mdb_to_xopti[table]
+        try:
+            elapsed_time = swap_table(
+                lambda: connect(xopti_table), xopti_table,
+                lambda shadow_cursor, shadow: copy_verified(
+                    shadow_cursor, table, shadow, xopti_table, column_mappings[table], row_counts.get(table)
+                ),
+                MAINTENANCE_WORK_MEM, SWAP_LOCK_TIMEOUT, SWAP_SET_LOGGED
+            )
+        except Exception:
+            discard_held_rejects()
+            raise
+        # The shadow's rows only count once it has been swapped in
+        write_held_rejects()
+        return elapsed_time
+
+    # Fallback loads go first so that swaps never wait on their locks when recreating foreign keys
+    workers = max(IMPORT_WORKERS, 1)
+    for mode, pending, load in (
+        ("truncate", fallback, lambda table: import_table(
+            table, mdb_to_xopti[table], column_mappings[table], row_counts.get(table), copy_filters.get(table)
+        )),
+        ("swap", swapped, swap),
+    ):
+        levels = load_levels(cursor, pending, mdb_to_xopti)
+        elapsed_times = import_tables_parallel(levels, mdb_to_xopti, row_counts, workers, checkpointed(load))
+        for table, elapsed_time in elapsed_times.items():
+            logger.info(f"Imported data|table={mdb_to_xopti[table]}|mode={mode}|rows={row_counts.get(table, 0)}|time={elapsed_time:.2f}")
+
+def resume_tables(cursor, journal, run_id, tables, mdb_to_xopti):
+    """Return the tables a resumed run still has to load, including finished ones a re-truncate would empty."""
+    pending = set(journal.tables_with_status(run_id, ("pending", "running", "failed")))
+    # Swap mode can fall back to TRUNCATE ... CASCADE too, so the closure applies to every mode
+    cascaded = truncate_closure(cursor, {mdb_to_xopti[table] for table in pending})
+    for table in tables:
+        if table not in pending and mdb_to_xopti[table] in cascaded:
+            logger.info(f"Reloading finished table emptied by cascade|table={mdb_to_xopti[table]}")
+            journal.mark(run_id, table, "pending")
+            pending.add(table)
+    return [table for table in tables if table in pending]
+
+def content_hash(table, spool_dir=None):
+    """Hash one table across every source with the load settings, spooling the hashed export into ``spool_dir`` if given."""
+    digest = hashlib.sha256(json.dumps([TRANSFORMS, SOURCE_COLUMN, [source_label(source) for source in MDB_SOURCES]]).encode())
+    for source in MDB_SOURCES:
+        if CHANGE_DETECTION == "pages":
+            digest.update(open_mdb(source).table_digest(table).encode())
+        elif spool_dir is not None:
+            descriptor, path = tempfile.mkstemp(suffix=".csv", dir=spool_dir)
+            with os.fdopen(descriptor, "wb") as spool:
+                digest.update(export_digest(source, table, spool).encode())
+            export_spools[table] = path
+        else:
+            digest.update(export_digest(source, table).encode())
+    return digest.hexdigest()
+
+def content_hashes(tables, spool_dir=None):
+    """Hash every table, IMPORT_WORKERS at a time; a table that cannot be hashed gets None and is reloaded."""
+    def hash_or_none(table):
+        try:
+            return content_hash(table, spool_dir)
+        except Exception as e:
+            logger.warning(f"Could not hash table|table={table}|error={e}")
+            return None
+
+    with tracer.span("hash"):
+        with ThreadPoolExecutor(max_workers=max(IMPORT_WORKERS, 1)) as executor:
+            return dict(zip(tables, executor.map(hash_or_none, tables)))
+
+def has_rows(cursor, xopti_table):
+    """Whether an xOpti table holds at least one row."""
+    cursor.execute(f'SELECT EXISTS (SELECT FROM "{xopti_table}")')
+    return cursor.fetchone()[0]
+
+def skip_unchanged(cursor, journal, run_id, tables, mdb_to_xopti, row_counts, hashes):
+    """Mark tables whose hash matches their last load (and that still hold their rows) as skipped and return the ones still to load."""
+    previous = journal.content_hashes(tables)
+    matching = [table for table in tables if hashes[table] is not None and previous.get(table) == hashes[table]]
+    existing = existing_tables(cursor, [mdb_to_xopti[table] for table in matching])
+    unchanged = {
+        table for table in matching
+        if mdb_to_xopti[table] in existing and (not row_counts.get(table) or has_rows(cursor, mdb_to_xopti[table]))
+    }
+    # Reloading a changed table empties the tables referencing it, unchanged or not
+    cascaded = truncate_closure(cursor, {mdb_to_xopti[table] for table in tables if table not in unchanged})
+    for table in tables:
+        if table in unchanged and mdb_to_xopti[table] in cascaded:
+            logger.info(f"Reloading unchanged table emptied by cascade|table={mdb_to_xopti[table]}")
+            unchanged.discard(table)
+    cursor.connection.commit()
+    pending = [table for table in tables if table not in unchanged]
+    journal.forget_hashes(pending)
+    for table in tables:
+        if table in unchanged:
+            spool = export_spools.pop(table, None)
+            if spool is not None:
+                os.remove(spool)
+            journal.mark(run_id, table, "skipped")
+            logger.info(f"Skipped unchanged table|table={mdb_to_xopti[table]}|hash={hashes[table][:12]}")
+    logger.info(f"Checked content hashes|mode={CHANGE_DETECTION}|tables={len(tables)}|unchanged={len(unchanged)}")
+    return pending
+
+def import_async(levels, mdb_to_xopti, column_mappings, row_counts, copy_filters, checkpointed):
+    """Load tables through the asyncio pipeline, overlapping each table's mdb-export with its COPY."""
+    if COPY_FORMAT != "csv" or MDB_READER != "mdb-export":
+        raise ValueError("COPY_PIPELINE=async streams mdb-export CSV and needs COPY_FORMAT=csv and MDB_READER=mdb-export")
+    if REJECT_MODE != "off" or TRANSFORMS or MULTI_SOURCE:
+        raise ValueError("REJECT_MODE, TRANSFORMS and MDB_FILES are not supported by COPY_PIPELINE=async")
+    if any(mdb_to_xopti[table] in VERIFY_AGGREGATES for level in levels for table in level):
+        logger.warning("Column sums are not verified by the async pipeline|check=rows only")
+
+    def job(table):
+        xopti_table = mdb_to_xopti[table]
+        mapping = column_mappings[table]
+        where = copy_filters.get(table)
+        return (
+            f"COPY \"{xopti_table}\" FROM STDIN WITH (FORMAT csv, HEADER true){copy_filter(where)}",
+            lambda headers: [mapping.get(header, snake_case(header)) for header in headers],
+            lambda rows: verify_copy(None, xopti_table, xopti_table, rows, row_counts.get(table), filtered=where is not None),
+        )
+
+    # One event loop per foreign key level, so referencing tables wait for their parents
+    results = {}
+    for level in levels:
+        ordered = sorted(level, key=lambda table: row_counts.get(table, 0), reverse=True)
+        results.update(run_async_loads(
+            {
+                "host": PG_HOST, "port": PG_PORT, "dbname": PG_DB, "user": PG_USER, "password": PG_PASSWORD,
+                "options": session_options(), "application_name": pool.application_name,
+            },
+            MDB_FILE, {table: job(table) for table in ordered}
+        ))
+
+    # Outcomes only come back once the loop finishes, so checkpoints are written afterwards
+    for table, outcome in results.items():
+        def report(table):
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+        try:
+            rows, elapsed_time = checkpointed(report)(table)
+        except Exception as e:
+            logger.error(f"Error importing table {table}: {str(e)}")
+            continue
+        tracer.record("copy", mdb_to_xopti[table], elapsed_time, rows=rows)
+        logger.info(f"Imported data|table={mdb_to_xopti[table]}|pipeline=async|rows={rows}|time={elapsed_time:.2f}")
+
+def import_full(cursor, tables, mdb_to_xopti, column_mappings, row_counts, checkpointed):
+    """Truncate and reload tables, in parallel when IMPORT_WORKERS > 1 or overlapped when COPY_PIPELINE=async."""
+    conn = cursor.connection
+
+    # Empty existing tables; partitioned tables with a cutoff only lose their recent months
+    copy_filters = plan_partition_reloads(cursor, tables, mdb_to_xopti)
+    existing = existing_tables(cursor, [mdb_to_xopti[table] for table in tables])
+    for table in tables:
+        xopti_table = mdb_to_xopti[table]
+        if table in copy_filters:
+            with tracer.span("truncate", xopti_table):
+                clear_recent_partitions(cursor, xopti_table)
+            continue
+        with tracer.span("truncate", xopti_table):
+            if xopti_table in existing:
+                cursor.execute(f"TRUNCATE TABLE \"{xopti_table}\" CASCADE;")
+        logger.info(f"Truncated table|table={xopti_table}")
+    levels = load_levels(cursor, tables, mdb_to_xopti)
+    conn.commit()
+
+    # Import new data, parent tables before the tables referencing them
+    if COPY_PIPELINE == "async":
+        import_async(levels, mdb_to_xopti, column_mappings, row_counts, copy_filters, checkpointed)
+        return
+    if IMPORT_WORKERS > 1:
+        elapsed_times = import_tables_parallel(
+            levels, mdb_to_xopti, row_counts, IMPORT_WORKERS,
+            checkpointed(lambda table: import_table(
+                table, mdb_to_xopti[table], column_mappings[table], row_counts.get(table), copy_filters.get(table)
+            ))
+        )
+        for table, elapsed_time in elapsed_times.items():
+            logger.info(f"Imported data|table={mdb_to_xopti[table]}|rows={row_counts.get(table, 0)}|time={elapsed_time:.2f}")
+        return
+
+    def load(table):
+        copy_verified(
+            cursor, table, mdb_to_xopti[table], mdb_to_xopti[table], column_mappings[table],
+            row_counts.get(table), where=copy_filters.get(table)
+        )
+        with tracer.span("commit", mdb_to_xopti[table]):
+            commit_durably(conn)
+        write_held_rejects()
+
+    load = checkpointed(load)
+    progress = tqdm([table for level in levels for table in level], desc="Importing tables")
+    for table in progress:
+        progress.set_description(f"Importing {mdb_to_xopti[table]}")
+        xopti_table = mdb_to_xopti[table]
+        logger.info(f"Starting import|table={xopti_table}")
+        start_time = time()
+        try:
+            load(table)
+        except Exception as e:
+            logger.error(f"Error importing table {table}: {str(e)}")
+            conn.rollback()
+            discard_held_rejects()
+            continue
+        elapsed_time = time() - start_time
+        row_count = row_counts.get(table, 0)
+        logger.info(f"Imported data|table={xopti_table}|rows={row_count}|time={elapsed_time:.2f}")
+
+def import_to_postgres(tables, resume=False):
+    """Import data from MDB to PostgreSQL."""
+    # The inner ``with conn`` commits what the run leaves open, which the pool would otherwise roll back
+    with connect() as conn, conn:
+        with conn.cursor() as cursor:
+            # Get row counts and mappings
+            with tracer.span("metadata"):
+                row_counts = get_source_row_counts(MDB_SOURCES)
+                name_map = build_name_map({table: get_column_names(MDB_FILE, table) for table in tables})
+                save_name_map(NAME_MAP_FILE, name_map)
+            mdb_to_xopti = name_map["tables"]
+            column_mappings = name_map["columns"]
+            unmatched = unmatched_aggregates({
+                mdb_to_xopti[table]: list(column_mappings[table].values()) + ([SOURCE_COLUMN] if SOURCE_COLUMN else [])
+                for table in tables
+            })
+            if unmatched:
+                logger.warning(f"VERIFY_AGGREGATES entries match no imported table or column|entries={','.join(unmatched)}")
+
+            if REJECT_MODE == "table":
+                ensure_rejects_table(cursor)
                 conn.commit()
-                
+
+            if SOURCE_COLUMN:
+                # import4 builds the source column and keys with the schema; the load only checks they are there
+                unprepared = unprepared_source_tables(cursor, [mdb_to_xopti[table] for table in tables], SOURCE_COLUMN)
+                if unprepared:
+                    raise ValueError(
+                        f"Tables {', '.join(unprepared)} lack {SOURCE_COLUMN} or keys on it; "
+                        "rebuild the schema with import4.py and the same SOURCE_COLUMN"
+                    )
+            elif len(MDB_SOURCES) > 1:
+                colliding = sorted(keyed_tables(cursor, [mdb_to_xopti[table] for table in tables]) - set(SHARED_TABLES))
+                if colliding:
+                    raise ValueError(
+                        f"Tables {', '.join(colliding)} have keys that rows from several sources would collide on; "
+                        "set SOURCE_COLUMN or list them in SHARED_TABLES"
+                    )
+
+            if INCREMENTAL:
+                if CHANGE_DETECTION != "off":
+                    logger.info("Ignoring CHANGE_DETECTION|reason=incremental mode keeps its own fingerprints")
+                if MULTI_SOURCE:
+                    raise ValueError("INCREMENTAL=1 fingerprints a single MDB file and cannot be combined with MDB_FILES or SOURCE_COLUMN")
+                if resume:
+                    logger.info("Ignoring --resume|reason=incremental mode keeps its own sync state")
+                import_incremental(cursor, tables, mdb_to_xopti, column_mappings, row_counts)
+                return
+
+            # Record per-table outcomes so an interrupted run can be resumed
+            journal = CheckpointJournal(CHECKPOINT_FILE)
+            source_name = ",".join(MDB_SOURCES)
+            source_key = ",".join(file_key(source) for source in MDB_SOURCES)
+            run_id = journal.resumable_run(source_name, source_key) if resume else None
+            if run_id is not None:
+                tables = resume_tables(cursor, journal, run_id, tables, mdb_to_xopti)
+                logger.info(f"Resuming run|run={run_id}|tables={len(tables)}")
+            else:
+                if resume:
+                    logger.info("No resumable run for this source|action=full import")
+                run_id = journal.start_run(source_name, source_key, LOAD_MODE, tables)
+            hashes = {}
+            spool_dir = None
+            # Export hashing keeps what it read when the load would stream the same bytes
+            if CHANGE_DETECTION == "export" and copies_raw_export() and COPY_PIPELINE != "async":
+                spool_dir = tempfile.mkdtemp(prefix="mdb_export_", dir=EXPORT_SPOOL_DIR)
+            checkpointed = lambda load: journal.checkpointed(run_id, load, lambda table: row_counts.get(table, 0), hashes.get)
+
+            try:
+                if CHANGE_DETECTION != "off":
+                    hashes.update(content_hashes(tables, spool_dir))
+                    tables = skip_unchanged(cursor, journal, run_id, tables, mdb_to_xopti, row_counts, hashes)
+                if LOAD_MODE == "swap":
+                    import_swap(cursor, tables, mdb_to_xopti, column_mappings, row_counts, checkpointed)
+                else:
+                    import_full(cursor, tables, mdb_to_xopti, column_mappings, row_counts, checkpointed)
+            finally:
+                if spool_dir is not None:
+                    export_spools.clear()
+                    shutil.rmtree(spool_dir, ignore_errors=True)
+                status = journal.finish_run(run_id)
+                failed = journal.tables_with_status(run_id, ("failed",))
+                logger.info(f"Checkpointed run|run={run_id}|status={status}|failed={','.join(failed)}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Import SynergyV MDB tables into xOpti.")
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="continue the last unfinished run over the same MDB file, loading only tables that did not finish"
+    )
+    return parser.parse_args()
+
 def main():
-    if not os.path.exists(MDB_FILE):
-        logger.error(f"MDB file not found|path={MDB_FILE}")
+    args = parse_args()
+    missing = [source for source in MDB_SOURCES if not os.path.exists(source)]
+    if missing:
+        logger.error(f"MDB file not found|path={','.join(missing)}")
         return
+    if len(MDB_SOURCES) > 1:
+        logger.info(f"Found sources|count={len(MDB_SOURCES)}|files={','.join(MDB_SOURCES)}")
 
-    tables = get_mdb_tables(MDB_FILE)
+    with tracer.span("metadata"):
+        tables = get_mdb_tables(MDB_FILE)
     if not tables or tables == ['']:
         logger.error(f"No tables found|file={MDB_FILE}")
         return
 
     logger.info(f"Found tables|tables={','.join(tables)}")
     start_time = time()
-    import_to_postgres(tables)
+    try:
+        import_to_postgres(tables, resume=args.resume)
+    finally:
+        shutdown_pool()
+        pool.close()
+        tracer.write_prometheus()
     total_time = time() - start_time
     logger.info(f"Import completed|total_time={total_time:.2f}")
 
@@ -0,0 +1,112 @@
+"""Fingerprint bookkeeping and upsert helpers for incremental SynergyV syncs."""
+import hashlib
+import json
+import os
+import subprocess
+
+from copy_stream import COPY_CHUNK_SIZE
+
+def load_state(path):
+    """Load the per-table fingerprints saved by the previous run, or an empty dict."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_state(path, state):
+    """Write the per-table fingerprints atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def export_digest(mdb_file, table, spool=None):
+    """Hash a table's mdb-export output (header excluded), optionally keeping the whole export in the file ``spool``."""
+    digest = hashlib.sha256()
+    process = subprocess.Popen(["mdb-export", "-b", "strip", "-H", mdb_file, table], stdout=subprocess.PIPE, bufsize=COPY_CHUNK_SIZE)
+    try:
+        header = process.stdout.readline()
+        if spool is not None:
+            spool.write(header)
+        for chunk in iter(lambda: process.stdout.read(COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            if spool is not None:
+                spool.write(chunk)
+    except Exception:
+        process.kill()
+        raise
+    finally:
+        process.wait()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, process.args)
+    return digest.hexdigest()
+
+def truncate_closure(cursor, tables):
+    """Return ``tables`` plus every table that TRUNCATE ... CASCADE on them would also empty."""
+    cursor.execute("""
+        SELECT confrelid::regclass::text, conrelid::regclass::text
+        FROM pg_constraint
+        WHERE contype = 'f'
+    """)
+    referencing = {}
+    for referenced, table in cursor.fetchall():
+        referencing.setdefault(referenced.strip('"'), set()).add(table.strip('"'))
+    closure = set(tables)
+    pending = list(closure)
+    while pending:
+        for table in referencing.get(pending.pop(), ()):
+            if table not in closure:
+                closure.add(table)
+                pending.append(table)
+    return closure
+
+def table_columns(cursor, table):
+    """Return the live column names of a table in ordinal order."""
+    cursor.execute("""
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+    """, (f'"{table}"',))
+    return [row[0] for row in cursor.fetchall()]
+
+def primary_key_columns(cursor, table):
+    """Return the primary key columns of a table in key order."""
+    cursor.execute("""
+        SELECT a.attname
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = %s::regclass AND i.indisprimary
+        ORDER BY array_position(i.indkey::int2[], a.attnum)
+    """, (f'"{table}"',))
+    return [row[0] for row in cursor.fetchall()]
+
+def create_stage_table(cursor, table):
+    """Create an index-free temporary copy of a table that disappears at commit."""
+    stage_table = f"{table}__stage"
+    cursor.execute(f'CREATE TEMP TABLE "{stage_table}" (LIKE "{table}" INCLUDING DEFAULTS) ON COMMIT DROP')
+    return stage_table
+
+def upsert_from_stage(cursor, table, stage_table, date_column, since=None):
+    """Upsert staged rows newer than ``since`` into ``table`` on its primary key.
+
+    Returns ``(rows_upserted, max_date)`` where ``max_date`` is the newest
+    ``date_column`` value seen in the stage table.
+    """
+    columns = table_columns(cursor, table)
+    key = primary_key_columns(cursor, table)
+    if not key:
+        raise ValueError(f"Table {table} has no primary key to upsert on")
+    column_list = ', '.join(f'"{col}"' for col in columns)
+    key_list = ', '.join(f'"{col}"' for col in key)
+    # A key-only table sets its key to itself, so the row count still includes every conflicting row
+    updated = [col for col in columns if col not in key] or key
+    updates = ', '.join(f'"{col}" = EXCLUDED."{col}"' for col in updated)
+    where_clause = f'WHERE "{date_column}" >= %(since)s' if since is not None else ""
+    cursor.execute(
+        f'INSERT INTO "{table}" ({column_list}) SELECT {column_list} FROM "{stage_table}" {where_clause} '
+        f'ON CONFLICT ({key_list}) DO UPDATE SET {updates}',
+        {"since": since}
+    )
+    rows_upserted = cursor.rowcount
+    cursor.execute(f'SELECT max("{date_column}") FROM "{stage_table}"')
+    return rows_upserted, cursor.fetchone()[0]
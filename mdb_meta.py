@@ -0,0 +1,117 @@
+"""On-disk cache for mdb-tools catalog lookups (tables, row counts, columns, schema).
+
+Entries are keyed by the MDB file's size, mtime and a hash of its first and
+last pages, so repeat runs against an unchanged file skip the mdb-tables,
+mdb-describe and mdb-schema subprocesses entirely.
+"""
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import threading
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("MDB_CACHE_DIR", ".mdb_cache")
+SAMPLE_SIZE = 64 * 1024
+# Bump when schema conversion output changes so cached conversions are not reused
+CONVERSION_VERSION = 2
+
+def run_subprocess(command):
+    """Run a subprocess command and return the output."""
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Subprocess failed|command={' '.join(command)}|error={e.stderr}")
+        raise
+
+def file_key(mdb_file):
+    """Identify an MDB file by size, mtime and a hash of its first and last pages."""
+    stat = os.stat(mdb_file)
+    digest = hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(mdb_file, "rb") as f:
+        digest.update(f.read(SAMPLE_SIZE))
+        f.seek(max(stat.st_size - SAMPLE_SIZE, 0))
+        digest.update(f.read(SAMPLE_SIZE))
+    return digest.hexdigest()[:16]
+
+class MdbMetadata:
+    """Catalog information for one MDB file, read through a persistent JSON cache."""
+    def __init__(self, mdb_file, cache_dir=CACHE_DIR):
+        self.mdb_file = mdb_file
+        name = os.path.splitext(os.path.basename(mdb_file))[0]
+        self.path = os.path.join(cache_dir, f"{name}-{file_key(mdb_file)}.json")
+        self._lock = threading.RLock()
+        self._data = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self._data = json.load(f)
+            logger.info(f"Loaded metadata cache|path={self.path}")
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._data, f)
+        os.replace(tmp_path, self.path)
+
+    def cached(self, key, compute):
+        """Return the cached value for ``key``, computing and persisting it on a miss."""
+        with self._lock:
+            if key not in self._data:
+                self._data[key] = compute()
+                self._save()
+            return self._data[key]
+
+    def tables(self):
+        """Table names, as listed by ``mdb-tables -1``."""
+        return self.cached("tables", lambda: run_subprocess(["mdb-tables", "-1", self.mdb_file]).split("\n"))
+
+    def row_counts(self):
+        """Row counts per table, as listed by ``mdb-tables -r``."""
+        def compute():
+            row_counts = {}
+            for line in run_subprocess(["mdb-tables", "-r", self.mdb_file]).split("\n"):
+                parts = line.split()
+                if len(parts) == 2:
+                    table_name, count_str = parts
+                    row_counts[table_name] = int(count_str)
+            return row_counts
+        return self.cached("row_counts", compute)
+
+    def describe(self, table):
+        """``[column, type]`` pairs for a table, as listed by ``mdb-describe``."""
+        def compute():
+            output = run_subprocess(["mdb-describe", self.mdb_file, table])
+            return [(line.split(None, 1) + [""])[:2] for line in output.split("\n") if line.strip()]
+        return self.cached(f"describe:{table}", compute)
+
+    def columns(self, table):
+        """Column names for a table."""
+        return [name for name, _ in self.describe(table)]
+
+    def column_types(self, table):
+        """Column name to mdb-describe type text for a table."""
+        return {name: column_type.strip() for name, column_type in self.describe(table)}
+
+    def schema(self, backend="postgres"):
+        """Raw ``mdb-schema`` output for a backend."""
+        return self.cached(f"schema:{backend}", lambda: run_subprocess(["mdb-schema", self.mdb_file, backend]))
+
+    def converted_schema(self, convert, *inputs):
+        """Cache the result of ``convert(schema, *inputs)``, keyed by a hash of the converter and its inputs."""
+        key_data = [CONVERSION_VERSION, convert.__module__, convert.__qualname__, inputs]
+        key = hashlib.sha256(json.dumps(key_data, sort_keys=True, default=dict).encode()).hexdigest()[:16]
+        return self.cached(f"converted_schema:{key}", lambda: convert(self.schema(), *inputs))
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+def get_metadata(mdb_file):
+    """Return the shared MdbMetadata for a file, opening its cache on first use."""
+    with _instances_lock:
+        if mdb_file not in _instances:
+            _instances[mdb_file] = MdbMetadata(mdb_file)
+        return _instances[mdb_file]
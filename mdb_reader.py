@@ -0,0 +1,490 @@
+"""Pure-Python reader for Jet4/ACE (.mdb/.accdb) data pages.
+
+Memory-maps the database file and decodes table rows straight from the data
+pages into Python values, so a table can be streamed to COPY without an
+mdb-export process formatting every value as text first. Only reading is
+supported; encrypted databases and Jet3 (Access 97) files are rejected.
+"""
+import hashlib
+import mmap
+import struct
+import threading
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+JET_VERSION_OFFSET = 0x14
+PAGE_SIZE = 4096
+MSYS_OBJECTS_PAGE = 2
+
+PAGE_DATA = 0x01
+PAGE_TDEF = 0x02
+
+# Row offset flags on data pages
+OFFSET_MASK = 0x1FFF
+DELETED_ROW = 0x8000
+OVERFLOW_ROW = 0x4000
+# Long-value (MEMO/OLE) pages carry this tag where data pages name their table
+LVAL_OWNER = struct.unpack('<I', b'LVAL')[0]
+
+# Column types
+COL_BOOL = 0x01
+COL_BYTE = 0x02
+COL_INT = 0x03
+COL_LONGINT = 0x04
+COL_MONEY = 0x05
+COL_FLOAT = 0x06
+COL_DOUBLE = 0x07
+COL_DATETIME = 0x08
+COL_BINARY = 0x09
+COL_TEXT = 0x0A
+COL_OLE = 0x0B
+COL_MEMO = 0x0C
+COL_REPID = 0x0F
+COL_NUMERIC = 0x10
+COL_COMPLEX = 0x12
+COL_BIGINT = 0x13
+
+ACCESS_EPOCH = datetime(1899, 12, 30)
+MS_PER_DAY = 86400000
+
+U16 = struct.Struct('<H')
+U32 = struct.Struct('<I')
+I16 = struct.Struct('<h')
+I32 = struct.Struct('<i')
+I64 = struct.Struct('<q')
+F32 = struct.Struct('<f')
+F64 = struct.Struct('<d')
+
+MdbColumn = namedtuple(
+    'MdbColumn',
+    'name type col_num var_col_num is_fixed fixed_offset size precision scale'
+)
+
+class MdbTable(namedtuple('MdbTable', 'name tdef_page num_rows num_var_cols columns usage_map')):
+    """Table definition decoded from a TDEF page chain; ``columns`` are in column-number order.
+
+    ``usage_map`` is the row pointer (page << 8 | row) of the map of pages
+    the table owns.
+    """
+    @property
+    def column_names(self):
+        return [column.name for column in self.columns]
+
+def decode_text(data):
+    """Decode a Jet4 text value, expanding "compressed" Unicode.
+
+    Compressed text starts with FF FE and holds one byte per character; a
+    NUL found where the next character starts switches to two-byte UCS-2
+    characters and back, as in mdbtools. NUL bytes inside a two-byte
+    character do not switch modes.
+    """
+    data = bytes(data)
+    if data[:2] != b'\xff\xfe':
+        return data.decode('utf-16-le', errors='replace')
+    parts = []
+    compressed = True
+    i = 2
+    while i < len(data):
+        if compressed:
+            end = data.find(b'\x00', i)
+            end = len(data) if end < 0 else end
+            parts.append(data[i:end].decode('latin-1'))
+        else:
+            end = i
+            while end + 1 < len(data) and data[end] != 0:
+                end += 2
+            parts.append(data[i:end].decode('utf-16-le', errors='replace'))
+            if end + 1 == len(data) and data[end] != 0:
+                break
+        compressed = not compressed
+        i = end + 1
+    return ''.join(parts)
+
+def decode_datetime(days):
+    """Convert an Access date (days since 1899-12-30, time as an unsigned fraction) to datetime."""
+    whole_days = int(days)
+    milliseconds = round(abs(days - whole_days) * MS_PER_DAY)
+    return ACCESS_EPOCH + timedelta(days=whole_days, milliseconds=milliseconds)
+
+def decode_numeric(data, scale):
+    """Decode a 17-byte Jet4 NUMERIC: a sign byte then four little-endian words, most significant first."""
+    unscaled = 0
+    for i in range(4):
+        unscaled = (unscaled << 32) | U32.unpack_from(data, 1 + i * 4)[0]
+    if data[0] & 0x80:
+        unscaled = -unscaled
+    return Decimal(unscaled).scaleb(-scale)
+
+class MdbFile:
+    """A memory-mapped Jet4/ACE database file."""
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buf = memoryview(self._map)
+        version = self._buf[JET_VERSION_OFFSET]
+        if version == 0:
+            self.close()
+            raise ValueError(f"Jet3 (Access 97) files are not supported: {path}")
+        self.page_count = len(self._map) // PAGE_SIZE
+        self._lock = threading.Lock()
+        self._data_pages = {}
+        self._lval_pages = None
+        self._catalog = None
+        self._tables = {}
+
+    def close(self):
+        self._buf.release()
+        self._map.close()
+        self._file.close()
+
+    def page(self, pgno):
+        """Return one page as a memoryview."""
+        start = pgno * PAGE_SIZE
+        return self._buf[start:start + PAGE_SIZE]
+
+    def _usage_map_pages(self, pointer):
+        """Yield the page numbers marked in the usage map at row pointer ``pointer``, in ascending order."""
+        page = self.page(pointer >> 8)
+        start, end, _ = self._row_bounds(page, pointer & 0xFF)
+        usage_map = page[start:end]
+        if usage_map[0] == 0:
+            # Inline map: a first page number and a bitmap of the pages following it
+            bitmaps = [(U32.unpack_from(usage_map, 1)[0], usage_map[5:])]
+        elif usage_map[0] == 1:
+            # Reference map: page numbers of bitmap pages, each covering a fixed run of pages
+            pages_per_map = (PAGE_SIZE - 4) * 8
+            bitmaps = []
+            for i in range((len(usage_map) - 1) // 4):
+                map_page = U32.unpack_from(usage_map, 1 + i * 4)[0]
+                if map_page:
+                    bitmaps.append((i * pages_per_map, self.page(map_page)[4:]))
+        else:
+            raise ValueError(f"Unknown usage map type {usage_map[0]} at page {pointer >> 8}")
+        for first, bitmap in bitmaps:
+            for byte_index, byte in enumerate(bitmap):
+                if byte:
+                    for bit in range(8):
+                        if byte >> bit & 1:
+                            yield first + byte_index * 8 + bit
+
+    def data_pages(self, table):
+        """Return the data pages of an MdbTable, in file order.
+
+        Pages come from the table's usage map, so freed pages and pages of
+        dropped tables are never read, and are kept only if they are data
+        pages that name the table as their owner.
+        """
+        with self._lock:
+            if table.tdef_page not in self._data_pages:
+                buf = self._buf
+                self._data_pages[table.tdef_page] = [
+                    pgno for pgno in self._usage_map_pages(table.usage_map)
+                    if pgno < self.page_count and buf[pgno * PAGE_SIZE] == PAGE_DATA
+                    and U32.unpack_from(buf, pgno * PAGE_SIZE + 4)[0] == table.tdef_page
+                ]
+            return self._data_pages[table.tdef_page]
+
+    def lval_pages(self):
+        """Return every long-value (MEMO/OLE) page in the file; they are reached by pointer, not by owner."""
+        with self._lock:
+            if self._lval_pages is None:
+                buf = self._buf
+                self._lval_pages = [
+                    pgno for pgno in range(1, self.page_count)
+                    if buf[pgno * PAGE_SIZE] == PAGE_DATA and U32.unpack_from(buf, pgno * PAGE_SIZE + 4)[0] == LVAL_OWNER
+                ]
+            return self._lval_pages
+
+    def _tdef_bytes(self, pgno):
+        """Concatenate a TDEF page chain into one buffer."""
+        page = self.page(pgno)
+        if page[0] != PAGE_TDEF:
+            raise ValueError(f"Page {pgno} is not a table definition page")
+        chunks = [bytes(page)]
+        next_page = U32.unpack_from(page, 4)[0]
+        while next_page:
+            page = self.page(next_page)
+            chunks.append(bytes(page[8:]))
+            next_page = U32.unpack_from(page, 4)[0]
+        return b''.join(chunks)
+
+    def read_table_definition(self, name, tdef_page):
+        """Decode the columns of the table whose definition starts at ``tdef_page``."""
+        tdef = self._tdef_bytes(tdef_page)
+        num_rows = U32.unpack_from(tdef, 16)[0]
+        num_var_cols = U16.unpack_from(tdef, 43)[0]
+        num_cols = U16.unpack_from(tdef, 45)[0]
+        num_real_idx = U32.unpack_from(tdef, 51)[0]
+        usage_map = U32.unpack_from(tdef, 55)[0]
+        offset = 63 + num_real_idx * 12
+
+        entries = []
+        for _ in range(num_cols):
+            entry = tdef[offset:offset + 25]
+            col_type = entry[0]
+            entries.append((
+                col_type,
+                U16.unpack_from(entry, 5)[0],
+                U16.unpack_from(entry, 7)[0],
+                bool(entry[15] & 0x01),
+                U16.unpack_from(entry, 21)[0],
+                0 if col_type == COL_BOOL else U16.unpack_from(entry, 23)[0],
+                entry[11],
+                entry[12],
+            ))
+            offset += 25
+
+        columns = []
+        for entry in entries:
+            name_len = U16.unpack_from(tdef, offset)[0]
+            col_name = decode_text(tdef[offset + 2:offset + 2 + name_len])
+            offset += 2 + name_len
+            col_type, col_num, var_col_num, is_fixed, fixed_offset, size, precision, scale = entry
+            columns.append(MdbColumn(col_name, col_type, col_num, var_col_num, is_fixed, fixed_offset, size, precision, scale))
+        columns.sort(key=lambda column: column.col_num)
+        return MdbTable(name, tdef_page, num_rows, num_var_cols, columns, usage_map)
+
+    def _catalog_entries(self):
+        """Map user table names to their TDEF pages, read from MSysObjects."""
+        if self._catalog is None:
+            msys = self.read_table_definition('MSysObjects', MSYS_OBJECTS_PAGE)
+            names = msys.column_names
+            catalog = {}
+            for row in self.iter_rows_of(msys):
+                entry = dict(zip(names, row))
+                obj_type = (entry.get('Type') or 0) & 0x7F7F
+                flags = entry.get('Flags') or 0
+                # Type 1 is a local table; flag bits 0x80000002 mark system and hidden tables
+                if obj_type == 1 and not flags & 0x80000002:
+                    catalog[entry['Name']] = entry['Id'] & 0x00FFFFFF
+            self._catalog = catalog
+        return self._catalog
+
+    def tables(self):
+        """User table names in catalog order."""
+        return list(self._catalog_entries())
+
+    def table(self, name):
+        """Return the MdbTable for a user table."""
+        if name not in self._tables:
+            catalog = self._catalog_entries()
+            if name not in catalog:
+                raise KeyError(f"Table not found in {self.path}: {name}")
+            self._tables[name] = self.read_table_definition(name, catalog[name])
+        return self._tables[name]
+
+    def _row_bounds(self, page, row):
+        """Return ``(start, end)`` of a row on a page, with ``end`` exclusive, plus its raw offset."""
+        raw = U16.unpack_from(page, 14 + row * 2)[0]
+        end = PAGE_SIZE if row == 0 else U16.unpack_from(page, 12 + row * 2)[0] & OFFSET_MASK
+        return raw & OFFSET_MASK, end, raw
+
+    def _resolve_overflow(self, page, start):
+        """Follow an overflow pointer to the page and bounds holding the moved row."""
+        seen = 0
+        while True:
+            row = page[start]
+            pgno = U32.unpack_from(page, start)[0] >> 8
+            page = self.page(pgno)
+            start, end, raw = self._row_bounds(page, row)
+            if not raw & OVERFLOW_ROW:
+                return page, start, end, (pgno, row)
+            seen += 1
+            if seen > 16:
+                raise ValueError(f"Overflow chain too long at page {pgno}")
+
+    def _page_rows(self, table):
+        """Yield ``(page, start, end)`` for every live row of a table."""
+        pages = self.data_pages(table)
+        # Overflow targets live on other pages; collect them first so they are only read via their pointer
+        targets = set()
+        for pgno in pages:
+            page = self.page(pgno)
+            for row in range(U16.unpack_from(page, 12)[0]):
+                start, _, raw = self._row_bounds(page, row)
+                if raw & OVERFLOW_ROW and not raw & DELETED_ROW:
+                    targets.add(self._resolve_overflow(page, start)[3])
+        for pgno in pages:
+            page = self.page(pgno)
+            for row in range(U16.unpack_from(page, 12)[0]):
+                start, end, raw = self._row_bounds(page, row)
+                if raw & DELETED_ROW or (pgno, row) in targets:
+                    continue
+                if raw & OVERFLOW_ROW:
+                    overflow_page, start, end, _ = self._resolve_overflow(page, start)
+                    yield overflow_page, start, end
+                else:
+                    yield page, start, end
+
+    def table_digest(self, name):
+        """Hash a table's definition and data pages without decoding any rows.
+
+        Long-value pages are not tagged with their table, so tables with
+        MEMO or OLE columns hash every long-value page in the file. Changed
+        rows always change the digest; a compacted file may change it for
+        unchanged rows too.
+        """
+        table = self.table(name)
+        digest = hashlib.sha256(self._tdef_bytes(table.tdef_page))
+        pages = list(self.data_pages(table))
+        if any(column.type in (COL_MEMO, COL_OLE) for column in table.columns):
+            pages += self.lval_pages()
+        for pgno in pages:
+            digest.update(self.page(pgno))
+        return digest.hexdigest()
+
+    def _read_lval(self, field):
+        """Read a MEMO/OLE value from its 12-byte long-value header."""
+        memo_len = U32.unpack_from(field, 0)[0]
+        length = memo_len & 0x3FFFFFFF
+        if memo_len & 0x80000000:
+            return bytes(field[12:12 + length])
+        pointer = U32.unpack_from(field, 4)[0]
+        if memo_len & 0x40000000:
+            page = self.page(pointer >> 8)
+            start, end, _ = self._row_bounds(page, pointer & 0xFF)
+            return bytes(page[start:end][:length])
+        chunks = []
+        remaining = length
+        while pointer and remaining > 0:
+            page = self.page(pointer >> 8)
+            start, end, _ = self._row_bounds(page, pointer & 0xFF)
+            pointer = U32.unpack_from(page, start)[0]
+            chunk = bytes(page[start + 4:end][:remaining])
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b''.join(chunks)
+
+    def _decode(self, column, data):
+        col_type = column.type
+        if col_type == COL_TEXT:
+            return decode_text(data)
+        if col_type == COL_LONGINT:
+            return I32.unpack_from(data)[0]
+        if col_type == COL_INT:
+            return I16.unpack_from(data)[0]
+        if col_type == COL_DATETIME:
+            return decode_datetime(F64.unpack_from(data)[0])
+        if col_type == COL_MONEY:
+            return Decimal(I64.unpack_from(data)[0]).scaleb(-4)
+        if col_type == COL_DOUBLE:
+            return F64.unpack_from(data)[0]
+        if col_type == COL_FLOAT:
+            return F32.unpack_from(data)[0]
+        if col_type == COL_NUMERIC:
+            return decode_numeric(data, column.scale)
+        if col_type == COL_BYTE:
+            return data[0]
+        if col_type == COL_MEMO:
+            return decode_text(self._read_lval(data)) if len(data) >= 12 else ''
+        if col_type == COL_OLE:
+            return self._read_lval(data) if len(data) >= 12 else b''
+        if col_type == COL_REPID:
+            return '{%s}' % str(uuid.UUID(bytes_le=bytes(data[:16]))).upper()
+        if col_type == COL_COMPLEX:
+            return I32.unpack_from(data)[0]
+        if col_type == COL_BIGINT:
+            return I64.unpack_from(data)[0]
+        return bytes(data)
+
+    def _crack_row(self, table, page, start, end):
+        """Split one row into column values following the Jet4 row layout."""
+        row = page[start:end]
+        last = len(row) - 1
+        row_cols = U16.unpack_from(row, 0)[0]
+        bitmask_size = (row_cols + 7) // 8
+        null_mask = row[last - bitmask_size + 1:]
+
+        row_var_cols = 0
+        var_offsets = ()
+        if table.num_var_cols:
+            row_var_cols = U16.unpack_from(row, last - bitmask_size - 1)[0]
+            var_offsets = [
+                U16.unpack_from(row, last - bitmask_size - 3 - i * 2)[0]
+                for i in range(row_var_cols + 1)
+            ]
+        row_fixed_cols = row_cols - row_var_cols
+
+        values = []
+        fixed_found = 0
+        for column in table.columns:
+            byte_num, bit_num = divmod(column.col_num, 8)
+            present = byte_num < len(null_mask) and null_mask[byte_num] & (1 << bit_num)
+            if column.type == COL_BOOL:
+                values.append(bool(present))
+                if column.is_fixed:
+                    fixed_found += 1
+                continue
+            if column.is_fixed and fixed_found < row_fixed_cols:
+                fixed_found += 1
+                if not present:
+                    values.append(None)
+                    continue
+                value_start = column.fixed_offset + 2
+                values.append(self._decode(column, row[value_start:value_start + column.size]))
+            elif not column.is_fixed and column.var_col_num < row_var_cols:
+                if not present:
+                    values.append(None)
+                    continue
+                value_start = var_offsets[column.var_col_num]
+                value_end = var_offsets[column.var_col_num + 1]
+                values.append(self._decode(column, row[value_start:value_end]) if value_end > value_start else
+                              ('' if column.type in (COL_TEXT, COL_MEMO) else None))
+            else:
+                values.append(None)
+        return tuple(values)
+
+    def iter_rows_of(self, table):
+        """Yield the rows of an MdbTable as tuples in column-number order."""
+        for page, start, end in self._page_rows(table):
+            yield self._crack_row(table, page, start, end)
+
+    def iter_rows(self, name):
+        """Yield the rows of a user table as tuples in column-number order."""
+        return self.iter_rows_of(self.table(name))
+
+    def iter_batches(self, name, batch_size=10000):
+        """Yield the rows of a user table in lists of up to ``batch_size`` tuples."""
+        batch = []
+        for row in self.iter_rows(name):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+_open_files = {}
+_open_files_lock = threading.Lock()
+
+def open_mdb(path):
+    """Return a shared MdbFile for a path, mapping it on first use."""
+    with _open_files_lock:
+        if path not in _open_files:
+            _open_files[path] = MdbFile(path)
+        return _open_files[path]
+
+def csv_field(value):
+    """Format one value the way COPY ... (FORMAT csv) reads it back; None becomes an unquoted empty field."""
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        if value == '' or any(c in value for c in ',"\r\n'):
+            return '"' + value.replace('"', '""') + '"'
+        return value
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, bytes):
+        return '\\x' + value.hex()
+    return str(value)
+
+def encode_csv_rows(rows):
+    """Encode a batch of row tuples as UTF-8 CSV bytes for COPY."""
+    return ''.join(','.join(map(csv_field, row)) + '\n' for row in rows).encode()
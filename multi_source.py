@@ -0,0 +1,293 @@
+"""Several MDB sources (one per store) loaded as one: source discovery, merged mdb-export streams and source keys.
+
+Every source runs its own mdb-export for a table at the same time. Their
+output is cut at CSV record boundaries and interleaved into a single
+header-less stream, so each table is still one COPY and a load takes about
+as long as the biggest store.
+
+Store tables get the source column appended to their primary and unique
+keys (and to the foreign keys pointing at them) so overlapping numbers from
+different stores can coexist. Reference tables listed in SHARED_TABLES hold
+the same rows in every store; they keep their keys and are de-duplicated on
+load instead.
+"""
+import glob
+import logging
+import os
+import queue
+import re
+import subprocess
+import threading
+
+from copy_stream import COPY_CHUNK_SIZE
+from swap import constraint_definitions, index_definitions, referencing_foreign_keys
+
+logger = logging.getLogger(__name__)
+
+# Chunks buffered between the per-source readers and the COPY
+MERGE_QUEUE_CHUNKS = int(os.getenv("MERGE_QUEUE_CHUNKS", 8))
+# Optional column that records which source each row came from
+SOURCE_COLUMN = os.getenv("SOURCE_COLUMN", "")
+# xOpti tables whose rows are the same in every source, loaded once per key
+SHARED_TABLES = [t.strip() for t in os.getenv("SHARED_TABLES", "").split(",") if t.strip()]
+
+DONE = object()
+
+def resolve_sources(spec):
+    """Expand a comma-separated list of MDB paths and glob patterns into an ordered, de-duplicated list of paths."""
+    sources = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        for path in sorted(glob.glob(item)) if glob.has_magic(item) else [item]:
+            if path not in sources:
+                sources.append(path)
+    return sources
+
+def source_label(path):
+    """Name a source after its file, e.g. branch01 for /data/branch01.mdb."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+def csv_field(value):
+    if any(c in value for c in ',"\r\n') or value == '':
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+class RecordSplitter:
+    """Cut a CSV byte stream at record boundaries, optionally appending a constant field to every record.
+
+    ``feed`` returns the complete records seen so far and keeps any partial
+    record for the next call; ``finish`` returns what is left.
+    """
+    def __init__(self, field=None):
+        self._suffix = b',' + csv_field(field).encode() if field is not None else b''
+        self._tail = b''
+        self._in_quotes = False
+
+    def feed(self, data):
+        parts = data.split(b'"')
+        end = -1
+        offset = 0
+        for i, part in enumerate(parts):
+            if i:
+                self._in_quotes = not self._in_quotes
+                offset += 1
+            if not self._in_quotes:
+                if self._suffix:
+                    part = parts[i] = part.replace(b'\n', self._suffix + b'\n')
+                newline = part.rfind(b'\n')
+                if newline >= 0:
+                    end = offset + newline
+            offset += len(part)
+        processed = b'"'.join(parts)
+        if end < 0:
+            self._tail += processed
+            return b''
+        complete = self._tail + processed[:end + 1]
+        self._tail = processed[end + 1:]
+        return complete
+
+    def finish(self):
+        tail, self._tail = self._tail, b''
+        return tail + self._suffix + b'\n' if tail else b''
+
+class MergedExport:
+    """mdb-export of one table from every source, merged into one stream of header-less CSV chunks.
+
+    All sources must export the same header. With ``label_sources`` each
+    record gets its source's label appended as an extra last field.
+    """
+    def __init__(self, sources, table, label_sources=False, queue_chunks=MERGE_QUEUE_CHUNKS, chunk_size=COPY_CHUNK_SIZE):
+        self.sources = sources
+        self.table = table
+        self.label_sources = label_sources
+        self.chunk_size = chunk_size
+        self._queue = queue.Queue(maxsize=queue_chunks)
+        self._stop = threading.Event()
+        self._processes = []
+        self._threads = []
+
+    def start(self):
+        """Start every export and return the shared header names."""
+        headers = None
+        for source in self.sources:
+            process = subprocess.Popen(["mdb-export", "-b", "strip", "-H", source, self.table], stdout=subprocess.PIPE, bufsize=self.chunk_size)
+            self._processes.append(process)
+        for source, process in zip(self.sources, self._processes):
+            source_headers = [header.strip() for header in process.stdout.readline().decode().strip().split(',')]
+            if headers is None:
+                headers = source_headers
+            elif source_headers != headers:
+                raise ValueError(f"Table {self.table} has different columns in {source} than in {self.sources[0]}")
+        for source, process in zip(self.sources, self._processes):
+            thread = threading.Thread(target=self._read, args=(source, process), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return headers
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read(self, source, process):
+        splitter = RecordSplitter(source_label(source) if self.label_sources else None)
+        try:
+            for chunk in iter(lambda: process.stdout.read(self.chunk_size), b''):
+                records = splitter.feed(chunk)
+                if records and not self._put(records):
+                    return
+            records = splitter.finish()
+            if records and not self._put(records):
+                return
+            if process.wait() != 0:
+                raise subprocess.CalledProcessError(process.returncode, process.args)
+            self._put(DONE)
+        except Exception as e:
+            self._put(e)
+
+    def chunks(self):
+        """Yield merged chunks until every source has finished, re-raising the first reader error."""
+        remaining = len(self._threads)
+        while remaining:
+            item = self._queue.get()
+            if item is DONE:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+
+    def close(self):
+        """Stop the readers and kill any export still running."""
+        self._stop.set()
+        for process in self._processes:
+            if process.poll() is None:
+                process.kill()
+        for thread in self._threads:
+            thread.join()
+        for process in self._processes:
+            process.wait()
+
+def column_list_span(definition, start=0):
+    """Return the ``(open, close)`` positions of the first parenthesised list at or after ``start``."""
+    open_at = definition.index("(", start)
+    depth = 0
+    for i in range(open_at, len(definition)):
+        if definition[i] == "(":
+            depth += 1
+        elif definition[i] == ")":
+            depth -= 1
+            if depth == 0:
+                return open_at, i
+    raise ValueError(f"Unbalanced column list in {definition}")
+
+def lists_column(definition, column, start=0):
+    open_at, close_at = column_list_span(definition, start)
+    return re.search(rf'(^|[\s,(]){re.escape(column)}($|[\s,)])|"{re.escape(column)}"', definition[open_at:close_at + 1]) is not None
+
+def append_column(definition, column, start=0):
+    """Append ``column`` to the first column list at or after ``start``."""
+    _, close_at = column_list_span(definition, start)
+    return f'{definition[:close_at]}, "{column}"{definition[close_at:]}'
+
+def keyed_tables(cursor, tables):
+    """Return the tables among ``tables`` that have a primary key or unique constraint or index."""
+    cursor.execute("""
+        SELECT DISTINCT c.relname
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indrelid
+        WHERE i.indisunique AND c.relname = ANY(%s)
+    """, (list(tables),))
+    return {row[0] for row in cursor.fetchall()}
+
+def tables_with_column(cursor, tables, column):
+    """Return the tables among ``tables`` that have ``column``."""
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        WHERE a.attname = %s AND NOT a.attisdropped AND c.relname = ANY(%s) AND pg_table_is_visible(c.oid)
+    """, (column, list(tables)))
+    return {row[0] for row in cursor.fetchall()}
+
+def keys_without_column(cursor, table, column):
+    """Return a table's primary and unique keys, then its unique indexes, that do not include ``column``."""
+    keys = [
+        (name, definition) for _, name, definition in constraint_definitions(cursor, table, ("p", "u"))
+        if not lists_column(definition, column)
+    ]
+    indexes = [
+        (name, using) for name, unique, using in index_definitions(cursor, table)
+        if unique and not lists_column(using, column)
+    ]
+    return keys, indexes
+
+def extend_source_keys(cursor, table, column, shared=()):
+    """Append ``column`` to a table's primary and unique keys and to the foreign keys referencing them.
+
+    Keys that already include the column are left alone. Referencing tables
+    carry the source column as well, so their foreign keys match on it too.
+    A shared table cannot reference a store table by source, so that case
+    is refused.
+    """
+    keys, indexes = keys_without_column(cursor, table, column)
+    if not keys and not indexes:
+        return 0
+    incoming = [
+        (referencing, name, definition) for referencing, name, definition in referencing_foreign_keys(cursor, table)
+        if not lists_column(definition, column)
+    ]
+    refused = sorted({referencing for referencing, _, _ in incoming if referencing.strip('"') in shared})
+    if refused:
+        raise ValueError(f"Shared tables {', '.join(refused)} reference {table}, whose keys need {column}")
+    for referencing, name, _ in incoming:
+        cursor.execute(f'ALTER TABLE {referencing} DROP CONSTRAINT "{name}"')
+    for name, definition in keys:
+        cursor.execute(f'ALTER TABLE "{table}" DROP CONSTRAINT "{name}"')
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {append_column(definition, column)}')
+    for name, using in indexes:
+        cursor.execute(f'DROP INDEX "{name}"')
+        cursor.execute(f'CREATE UNIQUE INDEX "{name}" ON "{table}" {append_column(using, column)}')
+    for referencing, name, definition in incoming:
+        definition = append_column(append_column(definition, column), column, definition.index("REFERENCES"))
+        cursor.execute(f'ALTER TABLE {referencing} ADD CONSTRAINT "{name}" {definition}')
+    logger.info(f"Extended keys with source column|table={table}|column={column}|keys={len(keys) + len(indexes)}|foreign_keys={len(incoming)}")
+    return len(keys) + len(indexes)
+
+def prepare_source_keys(cursor, tables, column, shared=SHARED_TABLES):
+    """Add the source column to every table and extend the keys of all but the shared ones; a rerun changes nothing."""
+    existing = tables_with_column(cursor, tables, column)
+    for table in tables:
+        if table not in existing:
+            cursor.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}" TEXT')
+    for table in tables:
+        if table not in shared:
+            extend_source_keys(cursor, table, column, shared)
+
+def unprepared_source_tables(cursor, tables, column, shared=SHARED_TABLES):
+    """Return the tables that prepare_source_keys would still change."""
+    existing = tables_with_column(cursor, tables, column)
+    return [
+        table for table in tables
+        if table not in existing or (table not in shared and any(keys_without_column(cursor, table, column)))
+    ]
+
+def insert_distinct(cursor, stage_table, table, key, columns, prefer=None):
+    """Copy the staged rows into ``table`` keeping one row per ``key``; return the rows inserted.
+
+    Among rows sharing a key the one with the lowest ``prefer`` value wins.
+    """
+    column_list = ", ".join(f'"{col}"' for col in columns)
+    key_list = ", ".join(f'"{col}"' for col in key)
+    order = key_list + (f', "{prefer}"' if prefer else "")
+    cursor.execute(
+        f'INSERT INTO "{table}" ({column_list}) '
+        f'SELECT DISTINCT ON ({key_list}) {column_list} FROM "{stage_table}" ORDER BY {order}'
+    )
+    return cursor.rowcount
@@ -0,0 +1,82 @@
+"""MDB to xOpti identifier mapping shared by the import and rename scripts."""
+import json
+import os
+import re
+from functools import lru_cache
+from types import MappingProxyType
+
+NAME_MAP_FILE = os.getenv("NAME_MAP_FILE", "name_map.json")
+
+UPPER_RUN = re.compile(r'([A-Z]+)')
+CAPITALISED_WORD = re.compile(r'([A-Z][a-z]+)')
+
+# Spelling fixes applied, in order, to every snake_cased name
+CORRECTIONS = (
+    ('rigth', 'right'),
+    ('dateof', 'date_of'),
+    ('leve_l', 'level'),
+    ('retailmark_down', 'retail_markdown'),
+    ('retail_mark_down', 'retail_markdown'),
+    ('paltform', 'platform'),
+    ('re_build', 'rebuild'),
+)
+
+# rename2.py's fixes; the importers now apply the same ones, so imported names are already final
+RENAME_CORRECTIONS = CORRECTIONS
+
+@lru_cache(maxsize=8192)
+def snake_case(s, corrections=CORRECTIONS):
+    """Convert a string to snake_case and apply the spelling corrections."""
+    name = '_'.join(
+        CAPITALISED_WORD.sub(r' \1',
+        UPPER_RUN.sub(r' \1',
+        s.replace('-', ' '))).split()).lower()
+    for wrong, right in corrections:
+        name = name.replace(wrong, right)
+    return name
+
+def build_name_map(columns_by_table, corrections=CORRECTIONS):
+    """Build a read-only MDB to xOpti name map from ``{mdb_table: [mdb_column, ...]}``.
+
+    The result has a ``tables`` mapping (MDB table to xOpti table) and a
+    ``columns`` mapping (MDB table to a mapping of MDB column to xOpti column).
+    """
+    return freeze_name_map({
+        "tables": {table: snake_case(table, corrections) for table in columns_by_table},
+        "columns": {
+            table: {col: snake_case(col, corrections) for col in columns}
+            for table, columns in columns_by_table.items()
+        },
+    })
+
+def freeze_name_map(name_map):
+    """Wrap a plain name map dict in read-only mappings."""
+    return MappingProxyType({
+        "tables": MappingProxyType(dict(name_map["tables"])),
+        "columns": MappingProxyType({
+            table: MappingProxyType(dict(columns)) for table, columns in name_map["columns"].items()
+        }),
+    })
+
+def save_name_map(path, name_map):
+    """Write a name map as JSON for the rename scripts to pick up."""
+    with open(path, "w") as f:
+        json.dump({
+            "tables": dict(name_map["tables"]),
+            "columns": {table: dict(columns) for table, columns in name_map["columns"].items()},
+        }, f, indent=2, sort_keys=True)
+
+def load_name_map(path):
+    """Load a saved name map, or an empty one if the file does not exist."""
+    if not os.path.exists(path):
+        return freeze_name_map({"tables": {}, "columns": {}})
+    with open(path) as f:
+        return freeze_name_map(json.load(f))
+
+def map_table_name(name_map, table, corrections=CORRECTIONS):
+    """Map a relation name through the name map, falling back to snake_case."""
+    return snake_case(name_map["tables"].get(table, table), corrections)
+
+def map_column_name(name_map, table, column, corrections=CORRECTIONS):
+    """Map a column name of ``table`` through the name map, falling back to snake_case."""
+    return snake_case(name_map["columns"].get(table, {}).get(column, column), corrections)
@@ -0,0 +1,140 @@
+"""Monthly range partitioning of the append-mostly transaction tables (tx_details, tx_header).
+
+The converted schema is rewritten so the chosen tables are declared
+``PARTITION BY RANGE`` on their date column, with one partition per month
+plus a DEFAULT partition for anything outside the created range. Reloads can
+then empty and refill only the months at or after a cutoff.
+"""
+import logging
+import os
+import re
+from datetime import date
+
+from ddl import CREATE_TABLE_NAME, split_statements
+
+logger = logging.getLogger(__name__)
+
+PARTITION_TABLES = [t.strip() for t in os.getenv("PARTITION_TABLES", "").split(",") if t.strip()]
+PARTITION_COLUMN = os.getenv("PARTITION_COLUMN", "date_of_entry")
+PARTITION_START = date.fromisoformat(os.getenv("PARTITION_START", "2010-01-01"))
+PARTITION_AHEAD_MONTHS = int(os.getenv("PARTITION_AHEAD_MONTHS", 12))
+# Reload cutoff: an explicit date, or a rolling number of months including the current one (0 reloads everything)
+PARTITION_SINCE = os.getenv("PARTITION_SINCE", "")
+PARTITION_RELOAD_MONTHS = int(os.getenv("PARTITION_RELOAD_MONTHS", 0))
+# Keys on a partitioned table must include the partition column; 1 appends it, weakening e.g. (tx_number) to per-date uniqueness
+PARTITION_WIDEN_KEYS = os.getenv("PARTITION_WIDEN_KEYS", "0") == "1"
+
+KEY_CONSTRAINT = re.compile(
+    r'^(alter\s+table\s+"([^"]+)"\s+add\s+constraint\s+"[^"]+"\s+(?:primary\s+key|unique)\s*\()([^)]*)(\).*)$',
+    re.IGNORECASE | re.DOTALL
+)
+UNIQUE_INDEX = re.compile(r'^(create\s+unique\s+index\s+"[^"]+"\s+on\s+"([^"]+)"\s*\()([^)]*)(\).*)$', re.IGNORECASE | re.DOTALL)
+RANGE_BOUND = re.compile(r"FOR VALUES FROM \('(\d{4})-(\d{2})-\d{2}")
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_cutoff(today=None):
+    """Return the first month to reload from PARTITION_SINCE / PARTITION_RELOAD_MONTHS, or None for a full reload."""
+    if PARTITION_SINCE:
+        return month_start(date.fromisoformat(PARTITION_SINCE))
+    if PARTITION_RELOAD_MONTHS > 0:
+        return add_months(month_start(today or date.today()), 1 - PARTITION_RELOAD_MONTHS)
+    return None
+
+def last_partition_month(today=None):
+    """Return the last month partitions are created for, PARTITION_AHEAD_MONTHS past the current one."""
+    return add_months(month_start(today or date.today()), PARTITION_AHEAD_MONTHS)
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+def default_partition_name(table):
+    return f"{table}_pdefault"
+
+def partition_schema(schema, tables, column, widen_keys=PARTITION_WIDEN_KEYS):
+    """Rewrite a converted schema so ``tables`` are range-partitioned on ``column``.
+
+    Primary keys and unique constraints on a partitioned table must include
+    the partition column. A key that lacks it is refused unless
+    ``widen_keys``, which appends the column and so only enforces the key
+    per date.
+    """
+    statements = []
+    narrowed = []
+    for stmt in split_statements(schema):
+        match = CREATE_TABLE_NAME.match(stmt)
+        if match and match.group(1) in tables:
+            stmt = f'{stmt} PARTITION BY RANGE ("{column}")'
+        else:
+            match = KEY_CONSTRAINT.match(stmt) or UNIQUE_INDEX.match(stmt)
+            if match and match.group(2) in tables and f'"{column}"' not in match.group(3):
+                narrowed.append(f"{match.group(2)}({match.group(3).strip()})")
+                stmt = f'{match.group(1)}{match.group(3)}, "{column}"{match.group(4)}'
+        statements.append(stmt)
+    if narrowed and not widen_keys:
+        raise ValueError(
+            f"Keys {', '.join(narrowed)} lack partition column {column}; partitioning would accept duplicates of them. "
+            "Set PARTITION_WIDEN_KEYS=1 to partition anyway or drop the tables from PARTITION_TABLES"
+        )
+    for key in narrowed:
+        logger.warning(f"Key is only unique per partition column value|key={key}|column={column}")
+    return ';\n'.join(statements) + ';'
+
+def is_partitioned(cursor, table):
+    """Return whether ``table`` exists as a partitioned table."""
+    cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (f'"{table}"',))
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+def partitioned_tables(cursor, tables):
+    """Return the subset of ``tables`` that are partitioned tables, in one catalog query."""
+    cursor.execute("SELECT relname FROM pg_class WHERE relkind = 'p' AND relname = ANY(%s)", (list(tables),))
+    return {row[0] for row in cursor.fetchall()}
+
+def existing_partitions(cursor, table):
+    """Return ``{month: partition}`` for a table's monthly partitions, keyed by the first day of the month."""
+    cursor.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (f'"{table}"',))
+    partitions = {}
+    for name, bound in cursor.fetchall():
+        match = RANGE_BOUND.match(bound)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+def ensure_partitions(cursor, table, first_month, last_month):
+    """Create the DEFAULT partition and every missing monthly partition from ``first_month`` to ``last_month``."""
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS "{default_partition_name(table)}" PARTITION OF "{table}" DEFAULT')
+    existing = existing_partitions(cursor, table)
+    month = month_start(first_month)
+    created = 0
+    while month <= last_month:
+        if month not in existing:
+            cursor.execute(
+                f'CREATE TABLE "{partition_name(table, month)}" PARTITION OF "{table}" '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            )
+            created += 1
+        month = add_months(month, 1)
+    if created:
+        logger.info(f"Created partitions|table={table}|count={created}")
+
+def clear_partitions_since(cursor, table, column, since):
+    """Empty the monthly partitions starting on or after ``since`` and the DEFAULT partition's rows from then on.
+
+    Earlier months are left untouched. Returns the names of the truncated partitions.
+    """
+    truncated = [name for month, name in sorted(existing_partitions(cursor, table).items()) if month >= since]
+    if truncated:
+        cursor.execute("TRUNCATE TABLE " + ", ".join(f'"{name}"' for name in truncated))
+    cursor.execute(f'DELETE FROM "{default_partition_name(table)}" WHERE "{column}" >= %s', (since,))
+    return truncated
@@ -0,0 +1,235 @@
+"""Encoder for PostgreSQL's binary COPY format, driven by the converted schema's column types."""
+import re
+import struct
+from datetime import date, datetime
+from decimal import Decimal
+
+HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+TRAILER = struct.pack('>h', -1)
+NULL_FIELD = struct.pack('>i', -1)
+
+PG_EPOCH = datetime(2000, 1, 1)
+PG_EPOCH_DATE = date(2000, 1, 1)
+
+TYPE_PARAMETERS = re.compile(r'\s*\(.*\)')
+
+INT2 = struct.Struct('>ih')
+INT4 = struct.Struct('>ii')
+INT8 = struct.Struct('>iq')
+FLOAT4 = struct.Struct('>if')
+FLOAT8 = struct.Struct('>id')
+FIELD_COUNT = struct.Struct('>h')
+NUMERIC_HEADER = struct.Struct('>ihhHH')
+
+TRUE_TEXT = {'1', '-1', 't', 'true', 'y', 'yes', 'on'}
+
+def base_type(pg_type):
+    """Strip length/precision parameters and NOT NULL from a column type."""
+    return TYPE_PARAMETERS.sub('', pg_type.upper().replace(' NOT NULL', '')).strip()
+
+def encode_text(value):
+    data = str(value).encode()
+    return struct.pack('>i', len(data)) + data
+
+def encode_bytea(value):
+    data = bytes(value)
+    return struct.pack('>i', len(data)) + data
+
+def encode_bool(value):
+    return b'\x00\x00\x00\x01\x01' if value else b'\x00\x00\x00\x01\x00'
+
+def encode_int2(value):
+    return INT2.pack(2, int(value))
+
+def encode_int4(value):
+    return INT4.pack(4, int(value))
+
+def encode_int8(value):
+    return INT8.pack(8, int(value))
+
+def encode_float4(value):
+    return FLOAT4.pack(4, float(value))
+
+def encode_float8(value):
+    return FLOAT8.pack(8, float(value))
+
+def encode_timestamp(value):
+    delta = value - PG_EPOCH
+    return INT8.pack(8, (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+def encode_date(value):
+    if isinstance(value, datetime):
+        value = value.date()
+    return INT4.pack(4, (value - PG_EPOCH_DATE).days)
+
+def encode_numeric(value):
+    """Encode a number as base-10000 NUMERIC digits with its display scale."""
+    if not isinstance(value, Decimal):
+        value = Decimal(repr(value)) if isinstance(value, float) else Decimal(value)
+    if value.is_nan():
+        return NUMERIC_HEADER.pack(8, 0, 0, 0xC000, 0)
+    sign, digits, exponent = value.as_tuple()
+    digits = ''.join(map(str, digits))
+    if exponent > 0:
+        digits += '0' * exponent
+        exponent = 0
+    dscale = -exponent
+    int_len = len(digits) - dscale
+    if int_len > 0:
+        int_part, frac_part = digits[:int_len], digits[int_len:]
+    else:
+        int_part, frac_part = '', '0' * -int_len + digits
+    int_part = int_part.zfill((len(int_part) + 3) // 4 * 4)
+    frac_part = frac_part.ljust((len(frac_part) + 3) // 4 * 4, '0')
+    groups = [int(int_part[i:i + 4]) for i in range(0, len(int_part), 4)]
+    groups += [int(frac_part[i:i + 4]) for i in range(0, len(frac_part), 4)]
+    weight = len(int_part) // 4 - 1
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+    if not groups:
+        weight = 0
+    size = 8 + 2 * len(groups)
+    return NUMERIC_HEADER.pack(size, len(groups), weight, 0x4000 if sign else 0, dscale) + struct.pack(f'>{len(groups)}H', *groups)
+
+ENCODERS = {
+    'SMALLINT': encode_int2,
+    'INTEGER': encode_int4,
+    'SERIAL': encode_int4,
+    'BIGINT': encode_int8,
+    'BIGSERIAL': encode_int8,
+    'REAL': encode_float4,
+    'DOUBLE PRECISION': encode_float8,
+    'NUMERIC': encode_numeric,
+    'DECIMAL': encode_numeric,
+    'BOOLEAN': encode_bool,
+    'TIMESTAMP WITHOUT TIME ZONE': encode_timestamp,
+    'TIMESTAMP': encode_timestamp,
+    'DATE': encode_date,
+    'VARCHAR': encode_text,
+    'CHARACTER VARYING': encode_text,
+    'CHAR': encode_text,
+    'TEXT': encode_text,
+    'BYTEA': encode_bytea,
+}
+
+def encoders_for(column_types):
+    """Return one field encoder per column type, raising ValueError for types with no binary encoder."""
+    encoders = []
+    for pg_type in column_types:
+        encoder = ENCODERS.get(base_type(pg_type))
+        if encoder is None:
+            raise ValueError(f"No binary COPY encoder for type {pg_type}")
+        encoders.append(encoder)
+    return encoders
+
+def parser_for(pg_type, date_format):
+    """Return a function turning mdb-export text into the Python value the type's encoder expects."""
+    kind = base_type(pg_type)
+    if kind in ('SMALLINT', 'INTEGER', 'SERIAL', 'BIGINT', 'BIGSERIAL'):
+        return lambda text: int(float(text)) if '.' in text or 'e' in text.lower() else int(text)
+    if kind in ('REAL', 'DOUBLE PRECISION'):
+        return float
+    if kind in ('NUMERIC', 'DECIMAL'):
+        return Decimal
+    if kind == 'BOOLEAN':
+        return lambda text: text.strip().lower() in TRUE_TEXT
+    if kind in ('TIMESTAMP WITHOUT TIME ZONE', 'TIMESTAMP', 'DATE'):
+        return lambda text: datetime.strptime(text, date_format)
+    if kind == 'BYTEA':
+        return lambda text: bytes.fromhex(text[2:]) if text.startswith('\\x') else text.encode()
+    return str
+
+def encode_rows(rows, encoders):
+    """Encode a batch of row tuples as binary COPY tuples (without header or trailer)."""
+    field_count = FIELD_COUNT.pack(len(encoders))
+    pairs = list(enumerate(encoders))
+    out = []
+    for row in rows:
+        out.append(field_count)
+        for i, encoder in pairs:
+            value = row[i]
+            out.append(NULL_FIELD if value is None else encoder(value))
+    return b''.join(out)
+
+def binary_copy_chunks(batches, encoders):
+    """Yield the complete binary COPY stream for an iterable of row batches."""
+    yield HEADER
+    for batch in batches:
+        yield encode_rows(batch, encoders)
+    yield TRAILER
+
+UNQUOTED_FIELD_END = re.compile(r'[,\r\n]')
+
+def split_record(text):
+    """Split one CSV record that may contain quoted fields; return None while a quoted field is still open."""
+    fields = []
+    i = 0
+    n = len(text)
+    while True:
+        if i < n and text[i] == '"':
+            parts = []
+            i += 1
+            while True:
+                j = text.find('"', i)
+                if j < 0:
+                    return None
+                parts.append(text[i:j])
+                if j + 1 < n and text[j + 1] == '"':
+                    parts.append('"')
+                    i = j + 2
+                    continue
+                i = j + 1
+                break
+            fields.append(''.join(parts))
+        else:
+            match = UNQUOTED_FIELD_END.search(text, i)
+            j = match.start() if match else n
+            fields.append(text[i:j] or None)
+            i = j
+        if i >= n or text[i] in '\r\n':
+            return fields
+        if text[i] != ',':
+            raise ValueError(f"Malformed CSV record: {text[:200]!r}")
+        i += 1
+
+def csv_records(lines):
+    """Parse mdb-export CSV lines into records with None for unquoted empty fields and '' for quoted ones.
+
+    mdb-export writes NULL as nothing and an empty string as "". The csv
+    module only tells them apart from Python 3.12 (QUOTE_NOTNULL), so the
+    records are split here. Lines without quotes take a plain split.
+    """
+    pending = None
+    for line in lines:
+        if pending is None and '"' not in line:
+            yield [field or None for field in line.rstrip('\r\n').split(',')]
+            continue
+        pending = line if pending is None else pending + line
+        record = split_record(pending)
+        if record is not None:
+            pending = None
+            yield record
+    if pending is not None:
+        raise ValueError("Unterminated quoted field at the end of the mdb-export output")
+
+def parse_csv_batches(records, parsers, batch_size=10000):
+    """Turn mdb-export CSV records into batches of typed row tuples.
+
+    ``records`` come from ``csv_records``: None fields become NULL, and so
+    do empty strings outside text columns.
+    """
+    batch = []
+    pairs = list(enumerate(parsers))
+    for record in records:
+        batch.append(tuple(
+            None if record[i] is None or (record[i] == '' and parse is not str) else parse(record[i])
+            for i, parse in pairs
+        ))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,86 @@
+"""Pooled xOpti connections that start with a bulk-load session profile.
+
+The profile travels in the libpq ``options`` startup parameter, so it costs
+no extra round trips and survives the RESET ALL that runs on every checkout.
+Each checkout also names the session after the table it loads, which shows
+up in pg_stat_activity.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+from psycopg2.pool import ThreadedConnectionPool
+
+APPLICATION_NAME = os.getenv("APPLICATION_NAME", "mdb-import")
+SESSION_PROFILE = {
+    # Bulk statements skip the WAL flush; the commit that finishes a table goes through commit_durably
+    "synchronous_commit": os.getenv("SESSION_SYNCHRONOUS_COMMIT", "off"),
+    "work_mem": os.getenv("SESSION_WORK_MEM", "256MB"),
+    "maintenance_work_mem": os.getenv("MAINTENANCE_WORK_MEM", "1GB"),
+    "statement_timeout": "0",
+}
+
+def session_options(profile=SESSION_PROFILE):
+    """Render a profile as ``-c name=value`` options for the connection string."""
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace(" ", "\\ ")
+    return " ".join(f"-c {name}={escape(value)}" for name, value in profile.items() if value != "")
+
+class ConnectionPool:
+    """Thread-safe pool of at most ``size`` connections; checkouts block while all are in use."""
+    def __init__(self, size, profile=SESSION_PROFILE, application_name=APPLICATION_NAME, **connect_kwargs):
+        self.application_name = application_name
+        self._slots = threading.BoundedSemaphore(size)
+        self._pool = ThreadedConnectionPool(
+            0, size, options=session_options(profile), application_name=application_name, **connect_kwargs
+        )
+
+    @contextmanager
+    def connection(self, label=None):
+        """Check out a connection, reset to the profile and named ``<application_name>:<label>``.
+
+        Whatever the caller left uncommitted is rolled back on return, and a
+        connection that broke is closed instead of going back to the pool.
+        """
+        self._slots.acquire()
+        conn = None
+        try:
+            conn = self._pool.getconn()
+            name = f"{self.application_name}:{label}" if label else self.application_name
+            with conn.cursor() as cursor:
+                cursor.execute("RESET ALL; SET application_name = %s", (name[:63],))
+            conn.commit()
+            yield conn
+        finally:
+            if conn is not None:
+                broken = bool(conn.closed)
+                if not broken:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        broken = True
+                self._pool.putconn(conn, close=broken)
+            self._slots.release()
+
+    def close(self):
+        self._pool.closeall()
+
+def commit_durably(conn):
+    """Commit with the WAL flushed first, for a commit the checkpoint journal or sync state will record as done.
+
+    Sessions run with synchronous_commit off, so without this a crash right
+    after the commit could lose a table the journal already marked done.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SET LOCAL synchronous_commit = on")
+    conn.commit()
+
+async def commit_durably_async(conn):
+    """commit_durably for a psycopg 3 async connection."""
+    await conn.execute("SET LOCAL synchronous_commit = on")
+    await conn.commit()
+
+def existing_tables(cursor, tables):
+    """Return the subset of ``tables`` that exist, in one catalog query."""
+    cursor.execute("SELECT tablename FROM pg_tables WHERE tablename = ANY(%s)", (list(tables),))
+    return {row[0] for row in cursor.fetchall()}
@@ -0,0 +1,194 @@
+"""Tolerant CSV COPY that quarantines the rows PostgreSQL rejects instead of failing the whole table.
+
+Records are copied in chunks under a savepoint. When a chunk fails it is
+rolled back and split in half until the failing records are isolated;
+those are written to the import_rejects table in the load's transaction,
+or to REJECT_FILE once it has committed, with the error text, and
+everything else is loaded. A table fails instead when its
+first record and the rest of a chunk fail with the same error, when a
+whole chunk is rejected, or when more than REJECT_MAX_SHARE of its records are.
+"""
+import csv
+import io
+import os
+import threading
+from datetime import datetime
+
+import psycopg2
+
+from copy_stream import COPY_CHUNK_SIZE
+
+# off, file (append to REJECT_FILE) or table (insert into import_rejects)
+REJECT_MODE = os.getenv("REJECT_MODE", "off")
+REJECT_FILE = os.getenv("REJECT_FILE", "import_rejects.csv")
+REJECT_CHUNK_ROWS = int(os.getenv("REJECT_CHUNK_ROWS", 50000))
+# Share of a table's records that may be quarantined before the table fails instead
+REJECT_MAX_SHARE = float(os.getenv("REJECT_MAX_SHARE", 0.01))
+REJECTS_TABLE = "import_rejects"
+
+_file_lock = threading.Lock()
+# File rejects wait here, per loading thread, until their table's transaction commits
+_held = threading.local()
+
+def ensure_rejects_table(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{REJECTS_TABLE}" (
+            "rejected_at" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            "table_name" TEXT NOT NULL,
+            "row_number" BIGINT NOT NULL,
+            "record" TEXT NOT NULL,
+            "error" TEXT NOT NULL
+        )
+    """)
+
+class Rejects:
+    """Rejected records of one table, inserted into the rejects table as they are found or held for the reject file."""
+    def __init__(self, table, mode=REJECT_MODE, path=REJECT_FILE):
+        self.table = table
+        self.mode = mode
+        self.path = path
+        self.count = 0
+        self._lines = []
+        if mode == "file":
+            held_rejects().append(self)
+
+    def add(self, cursor, row_number, record, error):
+        record = record.decode("utf-8", errors="replace").rstrip("\r\n")
+        error = str(error).strip()
+        if self.mode == "table":
+            cursor.execute(
+                f'INSERT INTO "{REJECTS_TABLE}" ("table_name", "row_number", "record", "error") VALUES (%s, %s, %s, %s)',
+                (self.table, row_number, record, error)
+            )
+        else:
+            self._lines.append([datetime.now().isoformat(timespec="seconds"), self.table, row_number, record, error])
+        self.count += 1
+
+    def write(self):
+        """Append the held rejects to the reject file."""
+        if not self._lines:
+            return
+        with _file_lock:
+            new_file = not os.path.exists(self.path)
+            with open(self.path, "a", newline="") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(["rejected_at", "table_name", "row_number", "record", "error"])
+                writer.writerows(self._lines)
+        self._lines = []
+
+def held_rejects():
+    """Return the file rejects this thread holds for loads that have not committed yet."""
+    if not hasattr(_held, "rejects"):
+        _held.rejects = []
+    return _held.rejects
+
+def write_held_rejects():
+    """Write this thread's held file rejects; call once the load's transaction has committed."""
+    rejects, _held.rejects = held_rejects(), []
+    for table_rejects in rejects:
+        table_rejects.write()
+
+def discard_held_rejects():
+    """Drop this thread's held file rejects after the load's transaction rolled back."""
+    _held.rejects = []
+
+def csv_records(stream):
+    """Yield the raw bytes of each CSV record, keeping newlines inside quoted fields in their record."""
+    record = b''
+    in_quotes = False
+    for line in iter(stream.readline, b''):
+        record += line
+        if line.count(b'"') % 2:
+            in_quotes = not in_quotes
+        if not in_quotes:
+            yield record
+            record = b''
+    if record:
+        yield record
+
+def copy_records(cursor, copy_sql, records):
+    """COPY records under a savepoint; return ``(rows, None)`` or ``(None, error)`` after rolling back."""
+    cursor.execute("SAVEPOINT quarantine")
+    try:
+        cursor.copy_expert(copy_sql, io.BytesIO(b''.join(records)), size=COPY_CHUNK_SIZE)
+    except psycopg2.Error as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT quarantine")
+        cursor.execute("RELEASE SAVEPOINT quarantine")
+        return None, e
+    rows = cursor.rowcount
+    cursor.execute("RELEASE SAVEPOINT quarantine")
+    return rows, None
+
+def same_error(error, other):
+    """Whether two COPY errors are the same failure, ignoring the line and context details."""
+    return (error.pgcode, error.diag.message_primary) == (other.pgcode, other.diag.message_primary)
+
+def bisect_copy(cursor, copy_sql, records, first_row, rejects, limit):
+    """COPY records, splitting failed runs in half until single bad records remain; return rows copied.
+
+    Raises ValueError as soon as more than ``limit`` records of the table have been rejected.
+    """
+    rows, error = copy_records(cursor, copy_sql, records)
+    if error is None:
+        return rows
+    if len(records) == 1:
+        rejects.add(cursor, first_row, records[0], error)
+        if rejects.count > limit:
+            raise ValueError(f"Rejected more than {limit} records of {rejects.table}; last error: {str(error).strip()}")
+        return 0
+    middle = len(records) // 2
+    return (
+        bisect_copy(cursor, copy_sql, records[:middle], first_row, rejects, limit)
+        + bisect_copy(cursor, copy_sql, records[middle:], first_row + middle, rejects, limit)
+    )
+
+def probe_error(cursor, copy_sql, records):
+    """COPY records under a savepoint that is always rolled back; return the error, or None if they would load."""
+    cursor.execute("SAVEPOINT quarantine_probe")
+    try:
+        cursor.copy_expert(copy_sql, io.BytesIO(b''.join(records)), size=COPY_CHUNK_SIZE)
+    except psycopg2.Error as e:
+        return e
+    finally:
+        cursor.execute("ROLLBACK TO SAVEPOINT quarantine_probe")
+        cursor.execute("RELEASE SAVEPOINT quarantine_probe")
+    return None
+
+def copy_chunk(cursor, copy_sql, chunk, first_row, rejects, limit):
+    """COPY one chunk, failing the table instead of bisecting when an error hits its records wholesale."""
+    rows, error = copy_records(cursor, copy_sql, chunk)
+    if error is None:
+        return rows
+    # A missing column or a wrong column type fails the first record and the rest alike; bisecting would reject them all
+    if len(chunk) > 1:
+        first_error = probe_error(cursor, copy_sql, chunk[:1])
+        if first_error is not None and same_error(error, first_error):
+            rest_error = probe_error(cursor, copy_sql, chunk[1:])
+            if rest_error is not None and same_error(error, rest_error):
+                raise ValueError(f"Every record of {rejects.table} fails: {str(error).strip()}")
+    copied = bisect_copy(cursor, copy_sql, chunk, first_row, rejects, limit)
+    if copied == 0 and len(chunk) > 1:
+        raise ValueError(f"Rejected a whole chunk of {len(chunk)} records of {rejects.table}")
+    return copied
+
+def copy_with_quarantine(cursor, copy_sql, stream, rejects, chunk_rows=REJECT_CHUNK_ROWS, max_share=REJECT_MAX_SHARE):
+    """COPY a header-less CSV stream in chunks of ``chunk_rows`` records, quarantining the ones that fail.
+
+    Row numbers in the rejects count data records from 1. Returns the rows
+    copied, or raises ValueError when the table fails as a whole.
+    """
+    copied = 0
+    first_row = 1
+    chunk = []
+    for record in csv_records(stream):
+        chunk.append(record)
+        if len(chunk) >= chunk_rows:
+            limit = max(int(max_share * (first_row - 1 + len(chunk))), 1)
+            copied += copy_chunk(cursor, copy_sql, chunk, first_row, rejects, limit)
+            first_row += len(chunk)
+            chunk = []
+    if chunk:
+        limit = max(int(max_share * (first_row - 1 + len(chunk))), 1)
+        copied += copy_chunk(cursor, copy_sql, chunk, first_row, rejects, limit)
+    return copied
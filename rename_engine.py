@@ -0,0 +1,113 @@
+"""Catalog-driven rename planning and single-batch execution for the rename scripts.
+
+The catalog is read straight from pg_class, pg_attribute and pg_index in one
+query, only identifiers whose target name differs produce a statement, and
+the whole batch runs server-side as one DO block in one transaction under a
+short lock timeout.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+RELATION_KINDS = {'r': 'TABLE', 'p': 'TABLE', 'v': 'VIEW', 'm': 'MATERIALIZED VIEW', 'i': 'INDEX', 'I': 'INDEX'}
+
+CATALOG_QUERY = """
+    SELECT c.relname, c.relkind, t.relname,
+           coalesce(array_agg(a.attname::text ORDER BY a.attnum) FILTER (WHERE a.attnum IS NOT NULL), '{}')
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_index i ON i.indexrelid = c.oid
+    LEFT JOIN pg_class t ON t.oid = i.indrelid
+    LEFT JOIN pg_attribute a
+           ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped AND c.relkind IN ('r', 'p', 'v', 'm')
+    WHERE n.nspname = %s AND c.relkind IN ('r', 'p', 'v', 'm', 'i', 'I')
+    GROUP BY c.oid, c.relname, c.relkind, t.relname
+"""
+
+def quote_ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def read_catalog(cursor, schema="public"):
+    """Return ``{relation: (kind, table, columns)}`` for a schema's tables, views and indexes in one round trip.
+
+    ``kind`` is the ALTER keyword (TABLE, VIEW, MATERIALIZED VIEW, INDEX);
+    ``table`` is the indexed table for indexes and None otherwise.
+    """
+    cursor.execute(CATALOG_QUERY, (schema,))
+    return {
+        name: (RELATION_KINDS[relkind], table, list(columns))
+        for name, relkind, table, columns in cursor.fetchall()
+    }
+
+def plan_renames(catalog, table_name, column_name, index_name=None):
+    """Return the ALTER ... RENAME statements that bring a catalog to its target names.
+
+    ``table_name(relation)`` and ``column_name(relation, column)`` give the
+    target names for relations and their columns; ``index_name(index)``
+    does the same for indexes, which are left alone without it. Relations
+    are renamed first, then columns under the new relation names, then
+    indexes. A rename onto a name that is already taken is skipped with a
+    warning rather than failing the whole batch.
+    """
+    taken = set(catalog)
+    relation_renames = []
+    column_renames = []
+    index_renames = []
+    for relation, (kind, _, columns) in sorted(catalog.items()):
+        if kind == 'INDEX':
+            new_relation = index_name(relation) if index_name else relation
+            renames = index_renames
+        else:
+            new_relation = table_name(relation)
+            renames = relation_renames
+        if new_relation != relation:
+            if new_relation in taken:
+                logger.warning(f"Skipped rename onto an existing name|relation={relation}|target={new_relation}")
+                new_relation = relation
+            else:
+                taken.discard(relation)
+                taken.add(new_relation)
+                renames.append(f"ALTER {kind} {quote_ident(relation)} RENAME TO {quote_ident(new_relation)};")
+        if kind == 'INDEX':
+            continue
+        column_names = set(columns)
+        for column in columns:
+            new_column = column_name(relation, column)
+            if new_column == column:
+                continue
+            if new_column in column_names:
+                logger.warning(f"Skipped column rename onto an existing name|relation={relation}|column={column}|target={new_column}")
+                continue
+            column_names.discard(column)
+            column_names.add(new_column)
+            # Views take RENAME COLUMN through ALTER TABLE as well
+            column_renames.append(
+                f"ALTER TABLE {quote_ident(new_relation)} RENAME COLUMN {quote_ident(column)} TO {quote_ident(new_column)};"
+            )
+    return relation_renames + column_renames + index_renames
+
+def rename_block(statements):
+    """Wrap rename statements in one DO block so they run in a single round trip."""
+    return "DO $rename$\nBEGIN\n" + "\n".join(f"    {stmt}" for stmt in statements) + "\nEND\n$rename$;"
+
+def write_rename_script(path, statements, lock_timeout, header=()):
+    """Write the statements as a script that applies them in one transaction, the way ``execute_renames`` does."""
+    with open(path, "w") as f:
+        for line in header:
+            f.write(f"-- {line}\n")
+        f.write(f"BEGIN;\nSET LOCAL lock_timeout = '{lock_timeout}';\n")
+        f.write(rename_block(statements) + "\n")
+        f.write("COMMIT;\n")
+
+def execute_renames(conn, statements, lock_timeout):
+    """Run every rename in one transaction; nothing is renamed if any statement or lock wait fails."""
+    if not statements:
+        return
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+            cursor.execute(rename_block(statements))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
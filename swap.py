@@ -0,0 +1,199 @@
+"""Reload a table into an unlogged shadow copy and swap it in with a short rename transaction.
+
+Readers keep seeing the old rows until the swap commits. The shadow table is
+created UNLOGGED and without indexes, so the COPY writes almost no WAL; its
+indexes, keys and privileges are rebuilt from the live table's catalog
+entries before the swap.
+"""
+import logging
+import re
+from time import time
+
+from pg_pool import commit_durably
+
+logger = logging.getLogger(__name__)
+
+INDEX_DEFINITION = re.compile(r'^CREATE (UNIQUE )?INDEX \S+ ON (?:ONLY )?\S+ (USING .*)$', re.DOTALL)
+
+def shadow_name(table):
+    return f"{table}__swap"
+
+def dependent_views(cursor, table):
+    """Return the views and materialized views that depend on a table."""
+    cursor.execute("""
+        SELECT DISTINCT v.oid::regclass::text
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid
+        JOIN pg_class v ON v.oid = r.ev_class
+        WHERE d.refobjid = %s::regclass AND d.classid = 'pg_rewrite'::regclass AND v.oid <> d.refobjid
+    """, (f'"{table}"',))
+    return [row[0] for row in cursor.fetchall()]
+
+def swap_blockers(cursor, table):
+    """Describe what dropping ``table`` would lose that a swap does not rebuild: dependent views, triggers, policies, row security."""
+    blockers = [f"view {view}" for view in dependent_views(cursor, table)]
+    cursor.execute(
+        "SELECT tgname FROM pg_trigger WHERE tgrelid = %s::regclass AND NOT tgisinternal ORDER BY tgname", (f'"{table}"',)
+    )
+    blockers += [f"trigger {row[0]}" for row in cursor.fetchall()]
+    cursor.execute("SELECT polname FROM pg_policy WHERE polrelid = %s::regclass ORDER BY polname", (f'"{table}"',))
+    blockers += [f"policy {row[0]}" for row in cursor.fetchall()]
+    cursor.execute("SELECT relrowsecurity FROM pg_class WHERE oid = %s::regclass", (f'"{table}"',))
+    if cursor.fetchone()[0]:
+        blockers.append("row level security")
+    return blockers
+
+def index_definitions(cursor, table):
+    """Return ``[(name, unique, using_clause)]`` for a table's indexes that do not back a constraint."""
+    cursor.execute("""
+        SELECT c.relname, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = %s::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid AND k.conrelid = i.indrelid)
+    """, (f'"{table}"',))
+    definitions = []
+    for name, definition in cursor.fetchall():
+        match = INDEX_DEFINITION.match(definition)
+        definitions.append((name, bool(match.group(1)), match.group(2)))
+    return definitions
+
+def constraint_definitions(cursor, table, contypes):
+    """Return ``[(oid, name, definition)]`` for a table's constraints of the given types ('p', 'u', 'f', ...)."""
+    cursor.execute("""
+        SELECT oid, conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = ANY(%s)
+        ORDER BY conname
+    """, (f'"{table}"', list(contypes)))
+    return cursor.fetchall()
+
+def referencing_foreign_keys(cursor, table):
+    """Return ``[(referencing_table, name, definition)]`` for foreign keys on other tables that point at ``table``."""
+    cursor.execute("""
+        SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE confrelid = %s::regclass AND contype = 'f' AND conrelid <> confrelid
+        ORDER BY conname
+    """, (f'"{table}"',))
+    return cursor.fetchall()
+
+def owned_sequences(cursor, table):
+    """Return ``[(sequence, column)]`` for sequences owned by a table's columns (SERIAL defaults)."""
+    cursor.execute("""
+        SELECT d.objid::regclass::text, a.attname
+        FROM pg_depend d
+        JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+        WHERE d.refobjid = %s::regclass AND d.classid = 'pg_class'::regclass AND d.deptype IN ('a', 'i')
+          AND (SELECT relkind FROM pg_class WHERE oid = d.objid) = 'S'
+    """, (f'"{table}"',))
+    return cursor.fetchall()
+
+def grant_statements(cursor, table):
+    """Return GRANT statements that restore the privileges other roles hold on ``table``."""
+    cursor.execute("""
+        SELECT CASE WHEN a.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(r.rolname) END, a.privilege_type
+        FROM pg_class c, aclexplode(c.relacl) a
+        LEFT JOIN pg_roles r ON r.oid = a.grantee
+        WHERE c.oid = %s::regclass AND a.grantee <> c.relowner
+    """, (f'"{table}"',))
+    return [f'GRANT {privilege} ON "{table}" TO {grantee}' for grantee, privilege in cursor.fetchall()]
+
+def create_shadow_table(cursor, table):
+    """Create an empty, unlogged, index-free copy of ``table`` and return its name."""
+    shadow = shadow_name(table)
+    cursor.execute(f'DROP TABLE IF EXISTS "{shadow}"')
+    cursor.execute(
+        f'CREATE UNLOGGED TABLE "{shadow}" '
+        f'(LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED INCLUDING COMMENTS)'
+    )
+    return shadow
+
+def build_shadow_indexes(cursor, table, maintenance_work_mem):
+    """Rebuild the live table's indexes and keys on its shadow under temporary names.
+
+    Returns ``(kind, temporary, original)`` entries for the swap to rename back.
+    """
+    shadow = shadow_name(table)
+    cursor.execute("SET maintenance_work_mem = %s", (maintenance_work_mem,))
+    renames = []
+    for oid, name, definition in constraint_definitions(cursor, table, ("p", "u", "x")):
+        temporary = f"swap_{oid}"
+        cursor.execute(f'ALTER TABLE "{shadow}" ADD CONSTRAINT "{temporary}" {definition}')
+        renames.append(("constraint", temporary, name))
+    for i, (name, unique, using) in enumerate(index_definitions(cursor, table)):
+        temporary = f"swap_{shadow}_{i}"[:63]
+        cursor.execute(f'CREATE {"UNIQUE " if unique else ""}INDEX "{temporary}" ON "{shadow}" {using}')
+        renames.append(("index", temporary, name))
+    return renames
+
+def swap_in(cursor, table, renames, lock_timeout):
+    """Replace ``table`` by its shadow in the caller's transaction.
+
+    Foreign keys pointing at the old table are recreated NOT VALID so the
+    swap does not scan the referencing tables; they are returned for
+    validation after commit.
+    """
+    shadow = shadow_name(table)
+    cursor.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+    cursor.execute(f'LOCK TABLE "{table}" IN ACCESS EXCLUSIVE MODE')
+    incoming = referencing_foreign_keys(cursor, table)
+    grants = grant_statements(cursor, table)
+    for sequence, column in owned_sequences(cursor, table):
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{shadow}"."{column}"')
+    # CASCADE only removes the incoming foreign keys; callers fall back to truncate when swap_blockers finds anything else
+    cursor.execute(f'DROP TABLE "{table}" CASCADE')
+    cursor.execute(f'ALTER TABLE "{shadow}" RENAME TO "{table}"')
+    for kind, temporary, name in renames:
+        if kind == "constraint":
+            cursor.execute(f'ALTER TABLE "{table}" RENAME CONSTRAINT "{temporary}" TO "{name}"')
+        else:
+            cursor.execute(f'ALTER INDEX "{temporary}" RENAME TO "{name}"')
+    for stmt in grants:
+        cursor.execute(stmt)
+    for referencing, name, definition in incoming:
+        cursor.execute(f'ALTER TABLE {referencing} ADD CONSTRAINT "{name}" {definition} NOT VALID')
+    return [(referencing, name) for referencing, name, _ in incoming]
+
+def swap_table(connection, table, load, maintenance_work_mem, lock_timeout, set_logged=True):
+    """Load ``table`` through an unlogged shadow copy and swap it in; return the elapsed time.
+
+    ``connection()`` returns a context manager giving the connection to work
+    on. ``load(cursor, shadow)`` fills the shadow table. The shadow is switched to
+    LOGGED before its indexes are built when ``set_logged`` is true or when
+    other tables reference it, since permanent tables cannot reference
+    unlogged ones.
+    """
+    start_time = time()
+    with connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                shadow = create_shadow_table(cursor, table)
+                conn.commit()
+                load(cursor, shadow)
+                conn.commit()
+                # SET LOGGED rewrites the table and every index on it, so it runs before the indexes exist
+                if set_logged or referencing_foreign_keys(cursor, table):
+                    cursor.execute(f'ALTER TABLE "{shadow}" SET LOGGED')
+                renames = build_shadow_indexes(cursor, table, maintenance_work_mem)
+                for _, name, definition in constraint_definitions(cursor, table, ("f",)):
+                    cursor.execute(f'ALTER TABLE "{shadow}" ADD CONSTRAINT "{name}" {definition}')
+                conn.commit()
+                incoming = swap_in(cursor, table, renames, lock_timeout)
+                commit_durably(conn)
+        except Exception:
+            conn.rollback()
+            with conn.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS "{shadow_name(table)}"')
+            conn.commit()
+            raise
+        # The table is swapped in by now; a key that fails to validate stays NOT VALID on the referencing table
+        for referencing, name in incoming:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(f'ALTER TABLE {referencing} VALIDATE CONSTRAINT "{name}"')
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.warning(f"Foreign key left NOT VALID|table={referencing}|constraint={name}|error={str(e).strip()}")
+    return time() - start_time
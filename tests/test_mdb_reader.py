@@ -0,0 +1,282 @@
+import os
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+import mdb_reader
+from mdb_reader import (
+    COL_BIGINT, COL_BINARY, COL_BOOL, COL_BYTE, COL_COMPLEX, COL_DATETIME, COL_DOUBLE, COL_FLOAT, COL_INT,
+    COL_LONGINT, COL_MEMO, COL_MONEY, COL_NUMERIC, COL_OLE, COL_REPID, COL_TEXT, F32, F64, I16, I32, I64,
+    PAGE_DATA, PAGE_SIZE, PAGE_TDEF, U16, U32, MdbFile, decode_text
+)
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "merchant_taylors.mdb")
+
+# --- A Jet4 file built page by page -----------------------------------------
+
+# Fixed-size columns: (type, size)
+FIXED_SIZES = {
+    COL_BOOL: 0, COL_BYTE: 1, COL_INT: 2, COL_LONGINT: 4, COL_MONEY: 8, COL_FLOAT: 4, COL_DOUBLE: 8,
+    COL_DATETIME: 8, COL_REPID: 16, COL_NUMERIC: 17, COL_COMPLEX: 4, COL_BIGINT: 8,
+}
+
+def compressed(text):
+    return b'\xff\xfe' + text.encode('latin-1')
+
+def data_page(owner, rows):
+    """A data page holding ``rows``, packed down from the end of the page."""
+    page = bytearray(PAGE_SIZE)
+    page[0] = PAGE_DATA
+    page[4:8] = owner if isinstance(owner, bytes) else U32.pack(owner)
+    page[12:14] = U16.pack(len(rows))
+    end = PAGE_SIZE
+    for i, row in enumerate(rows):
+        start = end - len(row)
+        page[start:end] = row
+        page[14 + i * 2:16 + i * 2] = U16.pack(start)
+        end = start
+    return page
+
+def layout(columns):
+    """Give ``[(name, type, precision, scale)]`` column numbers, var numbers and fixed offsets."""
+    laid_out = []
+    fixed_offset = 0
+    var_count = 0
+    for col_num, (name, col_type, precision, scale) in enumerate(columns):
+        if col_type in FIXED_SIZES:
+            size = FIXED_SIZES[col_type]
+            laid_out.append((name, col_type, col_num, 0, True, fixed_offset, size, precision, scale))
+            fixed_offset += size
+        else:
+            laid_out.append((name, col_type, col_num, var_count, False, 0, 255, precision, scale))
+            var_count += 1
+    return laid_out
+
+def tdef_page(columns, num_rows, usage_map):
+    page = bytearray(PAGE_SIZE)
+    page[0] = PAGE_TDEF
+    page[16:20] = U32.pack(num_rows)
+    page[43:45] = U16.pack(sum(1 for column in columns if not column[4]))
+    page[45:47] = U16.pack(len(columns))
+    page[55:59] = U32.pack(usage_map)
+    offset = 63
+    for name, col_type, col_num, var_col_num, fixed, fixed_offset, size, precision, scale in columns:
+        entry = bytearray(25)
+        entry[0] = col_type
+        entry[5:7] = U16.pack(col_num)
+        entry[7:9] = U16.pack(var_col_num)
+        entry[11] = precision
+        entry[12] = scale
+        entry[15] = 0x01 if fixed else 0x00
+        entry[21:23] = U16.pack(fixed_offset)
+        entry[23:25] = U16.pack(size)
+        page[offset:offset + 25] = entry
+        offset += 25
+    for column in columns:
+        name = column[0].encode('utf-16-le')
+        page[offset:offset + 2 + len(name)] = U16.pack(len(name)) + name
+        offset += 2 + len(name)
+    return page
+
+def encode_row(columns, values):
+    """Encode one row: column count, fixed area, variable data, variable offsets, count, null mask."""
+    fixed_area = bytearray(sum(column[6] for column in columns if column[4]))
+    var_values = []
+    mask = bytearray((len(columns) + 7) // 8)
+    for column, value in zip(columns, values):
+        _, col_type, col_num, _, fixed, fixed_offset, size, _, _ = column
+        if col_type == COL_BOOL:
+            present = bool(value)
+        else:
+            present = value is not None
+        if present:
+            mask[col_num // 8] |= 1 << (col_num % 8)
+        if fixed and col_type != COL_BOOL and value is not None:
+            fixed_area[fixed_offset:fixed_offset + size] = value
+        elif not fixed:
+            var_values.append(value or b'')
+    row = bytearray(U16.pack(len(columns)) + fixed_area)
+    offsets = []
+    for value in var_values:
+        offsets.append(len(row))
+        row += value
+    offsets.append(len(row))
+    for offset in reversed(offsets):
+        row += U16.pack(offset)
+    row += U16.pack(len(var_values)) + mask
+    return bytes(row)
+
+def numeric(unscaled):
+    sign = b'\x80' if unscaled < 0 else b'\x00'
+    unscaled = abs(unscaled)
+    return sign + b''.join(U32.pack((unscaled >> shift) & 0xFFFFFFFF) for shift in (96, 64, 32, 0))
+
+GUID = uuid.UUID('12345678-9abc-def0-1234-56789abcdef0')
+
+MSYS_COLUMNS = layout([("Id", COL_LONGINT, 0, 0), ("Name", COL_TEXT, 0, 0), ("Type", COL_INT, 0, 0), ("Flags", COL_LONGINT, 0, 0)])
+ALL_COLUMNS = layout([
+    ("flag", COL_BOOL, 0, 0),
+    ("tiny", COL_BYTE, 0, 0),
+    ("small", COL_INT, 0, 0),
+    ("whole", COL_LONGINT, 0, 0),
+    ("price", COL_MONEY, 0, 0),
+    ("single", COL_FLOAT, 0, 0),
+    ("double", COL_DOUBLE, 0, 0),
+    ("stamp", COL_DATETIME, 0, 0),
+    ("guid", COL_REPID, 0, 0),
+    ("amount", COL_NUMERIC, 18, 2),
+    ("attachment", COL_COMPLEX, 0, 0),
+    ("big", COL_BIGINT, 0, 0),
+    ("name", COL_TEXT, 0, 0),
+    ("raw", COL_BINARY, 0, 0),
+    ("memo", COL_MEMO, 0, 0),
+    ("blob", COL_OLE, 0, 0),
+])
+
+# Page numbers of the built file
+MSYS_DATA, USAGE_MAPS, USER_TDEF, USER_DATA, LVAL, STALE, LVAL_NEXT, USER_MAP = 4, 3, 5, 6, 7, 8, 9, 10
+
+def lval_pointer(page, row):
+    return U32.pack(page << 8 | row)
+
+def build_database(path):
+    ole_chunks = (b'\x01\x02\x03', b'\x04\x05')
+    full_row = encode_row(ALL_COLUMNS, [
+        True,
+        bytes([200]),
+        I16.pack(-2),
+        I32.pack(123456),
+        I64.pack(123400),
+        F32.pack(1.5),
+        F64.pack(2.25),
+        F64.pack(45000.5),
+        GUID.bytes_le,
+        numeric(-1234567),
+        I32.pack(7),
+        I64.pack(-(2 ** 40)),
+        b'\xff\xfe' + b'A\x00' + '€ '.encode('utf-16-le') + b'\x00B',
+        b'\x00\x01\xff',
+        # Single-page long value: the text is a whole row on the LVAL page
+        U32.pack(0x40000000 | 13) + lval_pointer(LVAL, 0) + U32.pack(0),
+        # Chained long value: each row starts with the pointer to the next
+        U32.pack(5) + lval_pointer(LVAL, 1) + U32.pack(0),
+    ])
+    sparse_row = encode_row(ALL_COLUMNS, [
+        False, None, None, None, None, None, None, F64.pack(-1.25), None, None, None, None,
+        'Ünï'.encode('utf-16-le'),
+        None,
+        U32.pack(0x80000000 | 9) + b'\x00' * 8 + compressed('in-line'),
+        b'',
+    ])
+    pages = [bytearray(PAGE_SIZE) for _ in range(USER_MAP + 1)]
+    pages[0][0x14] = 1
+    pages[2] = tdef_page(MSYS_COLUMNS, 2, U32.unpack(lval_pointer(USAGE_MAPS, 0))[0])
+    pages[USAGE_MAPS] = data_page(0, [
+        # Inline map: MSysObjects owns the page numbered by the first bit
+        b'\x00' + U32.pack(MSYS_DATA) + b'\x01',
+        # Reference map: one bitmap page covering pages from 0
+        b'\x01' + U32.pack(USER_MAP),
+    ])
+    pages[MSYS_DATA] = data_page(2, [
+        encode_row(MSYS_COLUMNS, [I32.pack(USER_TDEF), compressed('everything'), I16.pack(1), I32.pack(0)]),
+        encode_row(MSYS_COLUMNS, [I32.pack(99), compressed('MSysHidden'), I16.pack(1), U32.pack(0x80000002)]),
+    ])
+    pages[USER_TDEF] = tdef_page(ALL_COLUMNS, 2, U32.unpack(lval_pointer(USAGE_MAPS, 1))[0])
+    pages[USER_DATA] = data_page(USER_TDEF, [full_row, sparse_row])
+    pages[LVAL] = data_page(b'LVAL', [compressed('long memo t') + b'\x00\x00', lval_pointer(LVAL_NEXT, 0) + ole_chunks[0]])
+    pages[LVAL_NEXT] = data_page(b'LVAL', [U32.pack(0) + ole_chunks[1]])
+    # Owned by the table but not in its usage map, like a page freed by a delete
+    pages[STALE] = data_page(USER_TDEF, [encode_row(ALL_COLUMNS, [True] + [None] * 15)])
+    bitmap = bytearray(PAGE_SIZE - 4)
+    for pgno in (USER_DATA, LVAL):
+        bitmap[pgno // 8] |= 1 << (pgno % 8)
+    pages[USER_MAP] = bytearray(4) + bitmap
+    with open(path, 'wb') as f:
+        f.write(b''.join(bytes(page) for page in pages))
+    return path
+
+@pytest.fixture
+def built(tmp_path):
+    mdb = MdbFile(build_database(str(tmp_path / "built.mdb")))
+    yield mdb
+    mdb.close()
+
+# --- Tests ------------------------------------------------------------------
+
+def test_decode_text_switches_modes_only_at_character_boundaries():
+    assert decode_text(b'\xff\xfe' + b'A\x00' + '€ '.encode('utf-16-le') + b'\x00B') == 'A€ B'
+    assert decode_text(compressed('plain')) == 'plain'
+    assert decode_text(b'\xff\xfe\x00' + 'Ωμέγα'.encode('utf-16-le')) == 'Ωμέγα'
+    assert decode_text('Ünï'.encode('utf-16-le')) == 'Ünï'
+    assert decode_text(b'\xff\xfe') == ''
+
+def test_catalog_skips_system_tables(built):
+    assert built.tables() == ['everything']
+
+def test_every_column_type(built):
+    table = built.table('everything')
+    full, sparse = built.iter_rows('everything')
+    assert dict(zip(table.column_names, full)) == {
+        'flag': True,
+        'tiny': 200,
+        'small': -2,
+        'whole': 123456,
+        'price': Decimal('12.3400'),
+        'single': 1.5,
+        'double': 2.25,
+        'stamp': datetime(2023, 3, 15, 12, 0),
+        'guid': '{%s}' % str(GUID).upper(),
+        'amount': Decimal('-12345.67'),
+        'attachment': 7,
+        'big': -(2 ** 40),
+        'name': 'A€ B',
+        'raw': b'\x00\x01\xff',
+        'memo': 'long memo t',
+        'blob': b'\x01\x02\x03\x04\x05',
+    }
+    assert dict(zip(table.column_names, sparse)) == {
+        'flag': False, 'tiny': None, 'small': None, 'whole': None, 'price': None, 'single': None,
+        'double': None, 'stamp': datetime(1899, 12, 29, 6, 0), 'guid': None, 'amount': None,
+        'attachment': None, 'big': None, 'name': 'Ünï', 'raw': None, 'memo': 'in-line', 'blob': None,
+    }
+
+def test_data_pages_follow_the_usage_map(built):
+    table = built.table('everything')
+    # The LVAL page is in the map but owned by no table; the stale page is owned but unmapped
+    assert built.data_pages(table) == [USER_DATA]
+    assert len(list(built.iter_rows('everything'))) == table.num_rows
+
+def test_table_digest_covers_long_values(built):
+    digest = built.table_digest('everything')
+    assert digest == built.table_digest('everything')
+    assert built.lval_pages() == [LVAL, LVAL_NEXT]
+
+def test_fixture_rows():
+    mdb = MdbFile(FIXTURE)
+    try:
+        assert mdb.tables() == ['merchant_taylors']
+        table = mdb.table('merchant_taylors')
+        assert [column.type for column in table.columns] == [
+            COL_LONGINT, COL_TEXT, COL_TEXT, COL_TEXT, COL_TEXT, COL_TEXT, COL_TEXT,
+            COL_DATETIME, COL_DATETIME, COL_DATETIME, COL_MEMO, COL_TEXT,
+        ]
+        rows = list(mdb.iter_rows('merchant_taylors'))
+        assert len(rows) == table.num_rows == 20
+        assert rows[0] == (
+            1, 'Aaron', 'William', 'Redn.', None, None, 'Order of Court',
+            datetime(1760, 6, 5), datetime(1760, 7, 3), None, None, 'MF 324',
+        )
+        assert rows[-1][:5] == (25491, "'", 'Richard', 'Serv.', 'Samuel')
+        assert [len(batch) for batch in mdb.iter_batches('merchant_taylors', batch_size=8)] == [8, 8, 4]
+    finally:
+        mdb.close()
+
+def test_fixture_csv_encoding():
+    mdb = MdbFile(FIXTURE)
+    try:
+        first = next(mdb.iter_batches('merchant_taylors'))[:1]
+        assert mdb_reader.encode_csv_rows(first).startswith(b'1,Aaron,William,Redn.,,,Order of Court,1760-06-05 00:00:00')
+    finally:
+        mdb.close()
@@ -0,0 +1,31 @@
+import io
+
+import pytest
+
+from pg_binary import csv_records, parse_csv_batches, parser_for
+
+def records(text):
+    return list(csv_records(io.StringIO(text, newline="")))
+
+def test_unquoted_empty_is_null_and_quoted_empty_is_text():
+    assert records('1,,""\r\n2,"",\n') == [['1', None, ''], ['2', '', None]]
+
+def test_quoted_fields_keep_commas_quotes_and_newlines():
+    assert records('1,"a, ""b""","line one\nline two",x\n') == [['1', 'a, "b"', 'line one\nline two', 'x']]
+
+def test_single_column_null_row():
+    assert records('\n"only"\n') == [[None], ['only']]
+
+def test_last_line_without_newline():
+    assert records('1,"end"') == [['1', 'end']]
+
+def test_unterminated_and_malformed_records_raise():
+    with pytest.raises(ValueError):
+        records('1,"open\n')
+    with pytest.raises(ValueError):
+        records('1,"a"b\n')
+
+def test_parse_csv_batches_keeps_null_text_apart_from_empty_text():
+    parsers = [parser_for('INTEGER', '%Y-%m-%d %H:%M:%S'), parser_for('VARCHAR (20)', '%Y-%m-%d %H:%M:%S')]
+    batches = list(parse_csv_batches(csv_records(io.StringIO('1,\n,""\n', newline="")), parsers))
+    assert batches == [[(1, None), (None, '')]]
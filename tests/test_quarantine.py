@@ -0,0 +1,107 @@
+import io
+
+import psycopg2
+import pytest
+
+from quarantine import Rejects, copy_with_quarantine, discard_held_rejects, write_held_rejects
+
+@pytest.fixture(autouse=True)
+def no_held_rejects():
+    yield
+    discard_held_rejects()
+
+class CopyError(psycopg2.DataError):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+    @property
+    def pgcode(self):
+        return "22P02"
+
+    @property
+    def diag(self):
+        return type("Diag", (), {"message_primary": self.message})()
+
+class FakeCursor:
+    """Loads integer records into ``rows``, honouring savepoints; ``check`` raises for records it refuses."""
+    def __init__(self, check):
+        self.check = check
+        self.rows = []
+        self.savepoints = []
+        self.copies = 0
+        self.rowcount = -1
+
+    def execute(self, sql, params=None):
+        if sql.startswith("SAVEPOINT"):
+            self.savepoints.append(len(self.rows))
+        elif sql.startswith("ROLLBACK TO"):
+            del self.rows[self.savepoints[-1]:]
+        elif sql.startswith("RELEASE"):
+            self.savepoints.pop()
+
+    def copy_expert(self, sql, file, size=None):
+        self.copies += 1
+        loaded = []
+        for line in file.read().decode().splitlines():
+            self.check(line)
+            loaded.append(line)
+        self.rows += loaded
+        self.rowcount = len(loaded)
+
+def stream(values):
+    return io.BytesIO("".join(f"{value}\n" for value in values).encode())
+
+def rejecting(bad):
+    def check(line):
+        if line in bad:
+            raise CopyError(f'invalid input syntax for type integer: "{line}"')
+    return check
+
+def test_bad_records_are_quarantined(tmp_path):
+    cursor = FakeCursor(rejecting({"x", "y"}))
+    rejects = Rejects("t", mode="file", path=str(tmp_path / "rejects.csv"))
+    values = [str(i) for i in range(200)]
+    values[10], values[150] = "x", "y"
+    assert copy_with_quarantine(cursor, "COPY", stream(values), rejects, chunk_rows=100, max_share=0.05) == 198
+    assert rejects.count == 2
+    assert "x" not in cursor.rows and len(cursor.rows) == 198
+
+def test_bad_first_record_is_quarantined_not_fatal(tmp_path):
+    cursor = FakeCursor(rejecting({"x"}))
+    rejects = Rejects("t", mode="file", path=str(tmp_path / "rejects.csv"))
+    values = ["x"] + [str(i) for i in range(99)]
+    assert copy_with_quarantine(cursor, "COPY", stream(values), rejects, chunk_rows=100, max_share=0.05) == 99
+
+def test_error_on_every_record_fails_without_bisecting(tmp_path):
+    def check(line):
+        raise CopyError('column "qty" of relation "t" does not exist')
+    cursor = FakeCursor(check)
+    rejects = Rejects("t", mode="file", path=str(tmp_path / "rejects.csv"))
+    with pytest.raises(ValueError, match="Every record"):
+        copy_with_quarantine(cursor, "COPY", stream(range(1000)), rejects, chunk_rows=500)
+    assert cursor.copies == 3
+    assert rejects.count == 0
+
+def test_share_of_rejects_fails_the_table(tmp_path):
+    cursor = FakeCursor(rejecting({str(i) for i in range(1, 1000, 2)}))
+    rejects = Rejects("t", mode="file", path=str(tmp_path / "rejects.csv"))
+    with pytest.raises(ValueError, match="Rejected more than 10"):
+        copy_with_quarantine(cursor, "COPY", stream(range(1000)), rejects, chunk_rows=1000, max_share=0.01)
+    assert rejects.count == 11
+
+def test_file_rejects_are_written_only_after_commit(tmp_path):
+    path = tmp_path / "rejects.csv"
+    cursor = FakeCursor(rejecting({"x"}))
+    copy_with_quarantine(cursor, "COPY", stream(["1", "x", "2"]), Rejects("t", mode="file", path=str(path)), max_share=0.5)
+    assert not path.exists()
+    write_held_rejects()
+    assert path.read_text().splitlines()[1].endswith(',t,2,x,"invalid input syntax for type integer: ""x"""')
+
+def test_file_rejects_of_a_rolled_back_load_are_dropped(tmp_path):
+    path = tmp_path / "rejects.csv"
+    cursor = FakeCursor(rejecting({"x"}))
+    copy_with_quarantine(cursor, "COPY", stream(["1", "x", "2"]), Rejects("t", mode="file", path=str(path)), max_share=0.5)
+    discard_held_rejects()
+    write_held_rejects()
+    assert not path.exists()
@@ -0,0 +1,15 @@
+from datetime import date, datetime
+
+from transforms import null_zero_date
+
+def test_bare_zero_date_becomes_null():
+    assert null_zero_date(datetime(1899, 12, 30)) is None
+    assert null_zero_date(date(1899, 12, 30)) is None
+
+def test_time_only_values_are_kept():
+    assert null_zero_date(datetime(1899, 12, 30, 8, 30)) == datetime(1899, 12, 30, 8, 30)
+    assert null_zero_date(datetime(1899, 12, 30, 0, 0, 1)) == datetime(1899, 12, 30, 0, 0, 1)
+
+def test_real_dates_are_kept():
+    assert null_zero_date(datetime(2024, 5, 1)) == datetime(2024, 5, 1)
+    assert null_zero_date(date(2024, 5, 1)) == date(2024, 5, 1)
@@ -0,0 +1,123 @@
+"""Per-stage spans for the import scripts, exported as JSON lines and optionally a Prometheus text file.
+
+Each span records a stage (metadata, truncate, schema, extract, transform,
+copy, verify, commit, index), the table it ran for, its duration and the bytes and
+rows it moved. Set TRACE_FILE to append spans as JSON lines and
+PROMETHEUS_FILE to write per-stage totals in the node_exporter textfile
+format at the end of a run.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from time import time
+
+TRACE_FILE = os.getenv("TRACE_FILE")
+PROMETHEUS_FILE = os.getenv("PROMETHEUS_FILE")
+
+class Span:
+    """One timed stage; ``bytes`` and ``rows`` can be filled in while it is open."""
+    def __init__(self, stage, table=None, **attrs):
+        self.stage = stage
+        self.table = table
+        self.attrs = attrs
+        self.bytes = None
+        self.rows = None
+        self.start = time()
+        self.duration = None
+        self.status = "ok"
+
+    def as_record(self, run_id):
+        record = {
+            "run": run_id,
+            "stage": self.stage,
+            "table": self.table,
+            "start": round(self.start, 6),
+            "duration": round(self.duration, 6),
+            "bytes": self.bytes,
+            "rows": self.rows,
+            "status": self.status,
+        }
+        record.update(self.attrs)
+        return record
+
+class Tracer:
+    """Thread-safe span collector shared by all import workers."""
+    def __init__(self, trace_file=TRACE_FILE, prometheus_file=PROMETHEUS_FILE):
+        self.trace_file = trace_file
+        self.prometheus_file = prometheus_file
+        self.run_id = f"{int(time())}-{os.getpid()}"
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    @contextmanager
+    def span(self, stage, table=None, **attrs):
+        """Time the enclosed block as a span; exceptions mark it failed and propagate."""
+        span = Span(stage, table, **attrs)
+        try:
+            yield span
+        except BaseException:
+            span.status = "error"
+            raise
+        finally:
+            span.duration = time() - span.start
+            self._finish(span)
+
+    def record(self, stage, table, duration, bytes=None, rows=None, **attrs):
+        """Record a span whose duration was measured elsewhere, e.g. derived from stream meters."""
+        span = Span(stage, table, **attrs)
+        span.start -= duration
+        span.duration = max(duration, 0.0)
+        span.bytes = bytes
+        span.rows = rows
+        self._finish(span)
+
+    def totals(self):
+        """Return the per-stage totals so far as ``{(stage, table): {seconds, bytes, rows, count}}``."""
+        with self._lock:
+            return {key: dict(totals) for key, totals in self._totals.items()}
+
+    def _finish(self, span):
+        with self._lock:
+            totals = self._totals.setdefault((span.stage, span.table), {"seconds": 0.0, "bytes": 0, "rows": 0, "count": 0})
+            totals["seconds"] += span.duration
+            totals["bytes"] += span.bytes or 0
+            totals["rows"] += span.rows or 0
+            totals["count"] += 1
+            if self.trace_file:
+                with open(self.trace_file, "a") as f:
+                    f.write(json.dumps(span.as_record(self.run_id), default=str) + "\n")
+
+    def write_prometheus(self):
+        """Write per-stage, per-table totals as Prometheus text exposition, if PROMETHEUS_FILE is set."""
+        if not self.prometheus_file:
+            return
+        metrics = [
+            ("xopti_import_stage_seconds", "seconds", "Time spent in each import stage"),
+            ("xopti_import_stage_bytes", "bytes", "Bytes moved by each import stage"),
+            ("xopti_import_stage_rows", "rows", "Rows moved by each import stage"),
+            ("xopti_import_stage_spans", "count", "Number of spans recorded for each import stage"),
+        ]
+        lines = []
+        with self._lock:
+            for name, field, help_text in metrics:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                for (stage, table), totals in sorted(self._totals.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+                    labels = f'stage="{stage}"' + (f',table="{table}"' if table else "")
+                    lines.append(f"{name}{{{labels}}} {totals[field]}")
+        tmp_path = f"{self.prometheus_file}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prometheus_file)
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_tracer():
+    """Return the process-wide tracer."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
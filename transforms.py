@@ -0,0 +1,130 @@
+"""Per-column cleansing of typed rows for Access quirks, optionally spread over a process pool.
+
+Each transform in TRANSFORM_REGISTRY applies to a set of converted schema
+types; TRANSFORMS picks which ones run. Add an entry to the registry to plug
+in another transform. With TRANSFORM_WORKERS > 0 batches are cleansed in
+worker processes while the COPY stream keeps going, and results are
+yielded in their original order.
+"""
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from functools import lru_cache, partial
+
+from pg_binary import TRUE_TEXT, base_type
+
+TRANSFORMS = [t.strip() for t in os.getenv("TRANSFORMS", "").split(",") if t.strip()]
+TRANSFORM_WORKERS = int(os.getenv("TRANSFORM_WORKERS", 0))
+
+# Access stores an empty date as midnight of its zero date, and time-only values later on that day
+ACCESS_ZERO_DATE = date(1899, 12, 30)
+ACCESS_ZERO_DATETIME = datetime(1899, 12, 30)
+
+TEXT_TYPES = ('VARCHAR', 'CHARACTER VARYING', 'CHAR', 'TEXT')
+DATETIME_TYPES = ('TIMESTAMP WITHOUT TIME ZONE', 'TIMESTAMP', 'DATE')
+
+def rstrip_text(value):
+    return value.rstrip(' ')
+
+def null_zero_date(value):
+    """Null the bare zero date; a time-only value such as 1899-12-30 08:30 is kept."""
+    if isinstance(value, datetime):
+        return None if value == ACCESS_ZERO_DATETIME else value
+    return None if value == ACCESS_ZERO_DATE else value
+
+def round_real(value):
+    """Drop the float noise of a single-precision value, e.g. 0.10000000149 back to 0.1."""
+    return float(f"{value:.7g}")
+
+def coerce_boolean(value):
+    """Access stores True as -1; accept numbers and text as well as bools."""
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_TEXT
+    return bool(value)
+
+# name: (schema types it applies to, function, whether it may run on NOT NULL columns)
+TRANSFORM_REGISTRY = {
+    "rstrip": (TEXT_TYPES, rstrip_text, True),
+    "zero_date": (DATETIME_TYPES, null_zero_date, False),
+    "real": (('REAL',), round_real, True),
+    "boolean": (('BOOLEAN',), coerce_boolean, True),
+}
+
+@lru_cache(maxsize=None)
+def column_plan(column_types, not_null, enabled):
+    """Return ``((index, functions), ...)`` for the columns at least one enabled transform applies to."""
+    unknown = [name for name in enabled if name not in TRANSFORM_REGISTRY]
+    if unknown:
+        raise ValueError(f"Unknown transforms: {', '.join(unknown)}")
+    plan = []
+    for i, (pg_type, required) in enumerate(zip(column_types, not_null)):
+        kind = base_type(pg_type)
+        functions = tuple(
+            function for types, function, on_not_null in (TRANSFORM_REGISTRY[name] for name in enabled)
+            if kind in types and (on_not_null or not required)
+        )
+        if functions:
+            plan.append((i, functions))
+    return tuple(plan)
+
+def transform_batch(batch, column_types, not_null, enabled):
+    """Apply the enabled transforms to a batch of row tuples; NULLs are passed through untouched."""
+    plan = column_plan(column_types, not_null, enabled)
+    rows = []
+    for row in batch:
+        row = list(row)
+        for i, functions in plan:
+            value = row[i]
+            for function in functions:
+                if value is None:
+                    break
+                value = function(value)
+            row[i] = value
+        rows.append(tuple(row))
+    return rows
+
+def bounded_map(executor, function, items, window):
+    """Like ``executor.map`` but with at most ``window`` items submitted ahead of the consumer."""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return the process-wide transform pool, shared by all tables loading at once."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=TRANSFORM_WORKERS)
+        return _pool
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+def transform_batches(batches, column_types, not_null, enabled=TRANSFORMS, workers=TRANSFORM_WORKERS):
+    """Yield ``batches`` with the enabled transforms applied, in a process pool when ``workers`` > 0.
+
+    ``not_null`` flags the columns declared NOT NULL, which transforms that
+    can produce NULL leave alone.
+    """
+    column_types, not_null, enabled = tuple(column_types), tuple(not_null), tuple(enabled)
+    if not column_plan(column_types, not_null, enabled):
+        yield from batches
+        return
+    function = partial(transform_batch, column_types=column_types, not_null=not_null, enabled=enabled)
+    if workers <= 0:
+        yield from map(function, batches)
+        return
+    yield from bounded_map(get_pool(), function, batches, workers * 2)
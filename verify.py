@@ -0,0 +1,107 @@
+"""Post-COPY checks: rows COPY reported against the MDB catalog count, plus optional column sums.
+
+Source sums are accumulated from the rows as they stream into COPY, so the
+export is never read twice; the target side is one aggregate query over the
+table just loaded.
+"""
+import logging
+import os
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+def parse_aggregates(text):
+    """Parse ``table:column,column;table:column`` into ``{table: [columns]}``."""
+    aggregates = {}
+    for entry in text.split(";"):
+        table, _, columns = entry.partition(":")
+        columns = [column.strip() for column in columns.split(",") if column.strip()]
+        if table.strip() and columns:
+            aggregates[table.strip()] = columns
+    return aggregates
+
+VERIFY_AGGREGATES = parse_aggregates(os.getenv("VERIFY_AGGREGATES", ""))
+# Fail the table's transaction on a mismatch instead of only logging it
+VERIFY_STRICT = os.getenv("VERIFY_STRICT", "0") == "1"
+
+def unmatched_aggregates(columns_by_table, aggregates=None):
+    """Return the ``table`` and ``table.column`` entries of VERIFY_AGGREGATES that name nothing being loaded.
+
+    ``columns_by_table`` maps each loaded xOpti table to its xOpti column names.
+    """
+    aggregates = VERIFY_AGGREGATES if aggregates is None else aggregates
+    unmatched = []
+    for table, columns in aggregates.items():
+        if table not in columns_by_table:
+            unmatched.append(table)
+            continue
+        unmatched.extend(f"{table}.{column}" for column in columns if column not in columns_by_table[table])
+    return unmatched
+
+def to_decimal(value):
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    return Decimal(value)
+
+class ColumnSums:
+    """Running sums of selected columns, fed with batches of rows as they stream past."""
+    def __init__(self, columns):
+        self.columns = columns
+        self.sums = {}
+        self._indexes = []
+
+    def bind(self, names):
+        """Locate the summed columns in a row layout given as target column names."""
+        self._indexes = [(names.index(column), column) for column in self.columns if column in names]
+        self.sums = {column: Decimal(0) for _, column in self._indexes}
+
+    def add(self, rows):
+        for index, column in self._indexes:
+            self.sums[column] += sum(to_decimal(row[index]) for row in rows if row[index] not in (None, ""))
+
+    def tap(self, batches):
+        """Yield ``batches`` unchanged, adding each one to the sums on the way."""
+        for batch in batches:
+            self.add(batch)
+            yield batch
+
+def target_sums(cursor, table, columns):
+    """Sum columns of a loaded table in one query."""
+    cursor.execute(
+        "SELECT " + ", ".join(f'coalesce(sum("{column}"::numeric), 0)' for column in columns) + f' FROM "{table}"'
+    )
+    return dict(zip(columns, cursor.fetchone()))
+
+def verify_copy(cursor, xopti_table, target, copied, expected, sums=None, filtered=False, rejected=0):
+    """Compare a COPY's row count (and column sums) with the source and log the outcome.
+
+    ``target`` is the table the rows went into, which may be a shadow or
+    stage copy of ``xopti_table``. Quarantined rows count towards the
+    source total, and their presence leaves the sums unchecked. Filtered
+    COPYs are not compared with the catalog count. Returns whether everything matched; raises ValueError
+    instead when VERIFY_STRICT is set.
+    """
+    fields = [f"table={xopti_table}", f"copied={copied}", f"source={expected}"]
+    if rejected:
+        fields.append(f"rejected={rejected}")
+    mismatches = []
+    if copied is None or expected is None or filtered:
+        fields.append("rows=unchecked")
+    elif copied + rejected != expected:
+        mismatches.append("rows")
+    if sums is not None and sums.sums and rejected:
+        fields.append("sums=unchecked")
+    elif sums is not None and sums.sums:
+        loaded = target_sums(cursor, target, list(sums.sums))
+        for column, total in sums.sums.items():
+            fields.append(f"sum_{column}={total}/{loaded[column]}")
+            if total != loaded[column]:
+                mismatches.append(f"sum_{column}")
+    fields.append(f"status={'mismatch' if mismatches else 'ok'}")
+    if not mismatches:
+        logger.info("Verified table|" + "|".join(fields))
+        return True
+    logger.error("Verification failed|" + "|".join(fields) + f"|checks={','.join(mismatches)}")
+    if VERIFY_STRICT:
+        raise ValueError(f"Verification failed for {xopti_table}: {', '.join(mismatches)}")
+    return False